@@ -3,52 +3,161 @@
 Simple HTML dashboard generator for pipeline status
 """
 
+import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from html import escape as _esc
 from pipeline_logger import load_pipeline_history, load_release_history, get_pipeline_stats
 
-def generate_dashboard():
-    """Generate HTML dashboard"""
-    
-    stats = get_pipeline_stats()
-    pipeline_history = load_pipeline_history()
-    release_history = load_release_history()
-    
-    html = f"""<!DOCTYPE html>
+# Static page head and stylesheet (plain string, no brace escaping needed)
+_HEAD = """<!DOCTYPE html>
 <html>
 <head>
     <title>ReVanced Pipeline Dashboard</title>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
-        .container {{ max-width: 1200px; margin: 0 auto; }}
-        .header {{ background: #2d3748; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }}
-        .stats {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin-bottom: 20px; }}
-        .stat-card {{ background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-        .stat-number {{ font-size: 2em; font-weight: bold; color: #2d3748; }}
-        .stat-label {{ color: #666; font-size: 0.9em; }}
-        .section {{ background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); margin-bottom: 20px; }}
-        .section h2 {{ margin-top: 0; color: #2d3748; }}
-        .run-item {{ border-bottom: 1px solid #eee; padding: 10px 0; }}
-        .run-item:last-child {{ border-bottom: none; }}
-        .status {{ padding: 4px 8px; border-radius: 4px; font-size: 0.8em; font-weight: bold; }}
-        .status.success {{ background: #c6f6d5; color: #22543d; }}
-        .status.partial {{ background: #fef5e7; color: #744210; }}
-        .status.failed {{ background: #fed7d7; color: #742a2a; }}
-        .app-list {{ display: flex; flex-wrap: wrap; gap: 8px; }}
-        .app-tag {{ background: #e2e8f0; padding: 4px 8px; border-radius: 4px; font-size: 0.8em; }}
-        table {{ width: 100%; border-collapse: collapse; }}
-        th, td {{ text-align: left; padding: 8px; border-bottom: 1px solid #eee; }}
-        th {{ background: #f7fafc; font-weight: bold; }}
+        body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+        .container { max-width: 1200px; margin: 0 auto; }
+        .header { background: #2d3748; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }
+        .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin-bottom: 20px; }
+        .stat-card { background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .stat-number { font-size: 2em; font-weight: bold; color: #2d3748; }
+        .stat-label { color: #666; font-size: 0.9em; }
+        .section { background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); margin-bottom: 20px; }
+        .section h2 { margin-top: 0; color: #2d3748; }
+        .run-item { border-bottom: 1px solid #eee; padding: 10px 0; }
+        .run-item:last-child { border-bottom: none; }
+        .status { padding: 4px 8px; border-radius: 4px; font-size: 0.8em; font-weight: bold; }
+        .status.success { background: #c6f6d5; color: #22543d; }
+        .status.partial { background: #fef5e7; color: #744210; }
+        .status.failed { background: #fed7d7; color: #742a2a; }
+        .status.skipped { background: #e2e8f0; color: #4a5568; }
+        .app-list { display: flex; flex-wrap: wrap; gap: 8px; }
+        .app-tag { background: #e2e8f0; padding: 4px 8px; border-radius: 4px; font-size: 0.8em; }
+        table { width: 100%; border-collapse: collapse; }
+        th, td { text-align: left; padding: 8px; border-bottom: 1px solid #eee; }
+        th { background: #f7fafc; font-weight: bold; }
     </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
-            <h1>🚀 ReVanced Pipeline Dashboard</h1>
-            <p>Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+"""
+
+# Closes the runs section and opens the releases table
+_RELEASES_TABLE_HEAD = """
+        </div>
+        
+        <div class="section">
+            <h2>🎁 Recent Releases</h2>
+            <table>
+                <tr>
+                    <th>Tag</th>
+                    <th>Date</th>
+                    <th>Apps</th>
+                    <th>Size</th>
+                    <th>Architectures</th>
+                </tr>
+"""
+
+_FOOT = """
+            </table>
+        </div>
+    </div>
+</body>
+</html>"""
+
+# Known run statuses (anything else is shown as partial) and Yes/No labels
+_STATUS_CLASSES = {'success', 'partial', 'failed', 'skipped'}
+_YESNO = ('No', 'Yes')
+
+# Pre-rendered page for the first run, before any history exists
+_EMPTY_DASHBOARD_HTML = _HEAD + """            <h1>🚀 ReVanced Pipeline Dashboard</h1>
+            <p>No pipeline runs recorded yet.</p>
+        </div>
+    </div>
+</body>
+</html>"""
+
+def _fmt_ts(iso: str) -> str:
+    """Format an ISO timestamp as 'YYYY-MM-DD HH:MM' without re-parsing it"""
+    return iso[:16].replace('T', ' ')
+
+def _fmt_date(iso: str) -> str:
+    """Format an ISO timestamp as 'YYYY-MM-DD'"""
+    return iso[:10]
+
+def render_run_item(run):
+    """Render a single pipeline run entry"""
+    timestamp = _fmt_ts(run['timestamp'])
+    status = run.get('status', '')
+    status_class = status if status in _STATUS_CLASSES else 'partial'
+    
+    summary = run.get('summary', {})
+    
+    parts = [f"""
+            <div class="run-item">
+                <div style="display: flex; justify-content: between; align-items: center;">
+                    <div style="flex: 1;">
+                        <strong>Run #{_esc(str(run['run_number']))}</strong> - {timestamp}
+                        <span class="status {status_class}">{_esc(status.upper())}</span>
+                    </div>
+                    <div style="text-align: right; font-size: 0.9em; color: #666;">
+                        Trigger: {_esc(run['trigger'])} | Actor: {_esc(run['actor'])}
+                    </div>
+                </div>
+"""]
+    
+    if summary:
+        get = summary.get
+        downloads_ok = get('downloads_successful', 0)
+        downloads_failed = get('downloads_failed', 0)
+        patches_ok = get('patches_successful', 0)
+        patches_failed = get('patches_failed', 0)
+        release_created = _YESNO[bool(get('release_created'))]
+        
+        parts.append(f"""
+                <div style="margin-top: 8px; font-size: 0.9em;">
+                    Downloads: {downloads_ok} ✓, {downloads_failed} ✗ | 
+                    Patches: {patches_ok} ✓, {patches_failed} ✗ | 
+                    Release: {release_created}
+                </div>
+""")
+    
+    parts.append("</div>")
+    return "".join(parts)
+
+def render_release_row(release):
+    """Render a single release table row"""
+    timestamp = _fmt_date(release['timestamp'])
+    
+    # Count unique apps
+    app_count = len({app['name'] for app in release['apps_released']})
+    
+    # Architecture summary
+    arch_summary = "<br>".join(
+        f"{_esc(app_name)} ({_esc(', '.join(architectures))})"
+        for app_name, architectures in release['architecture_variants'].items()
+    )
+    
+    return f"""
+                <tr>
+                    <td><a href="{_esc(release.get('url') or '#')}" target="_blank">{_esc(release['tag'] or '')}</a></td>
+                    <td>{timestamp}</td>
+                    <td>{app_count}</td>
+                    <td>{release['total_size_mb']} MB</td>
+                    <td>{arch_summary}</td>
+                </tr>
+"""
+
+def write_dashboard_body(f, stats, pipeline_history, release_history):
+    """Write the full dashboard page to an open file"""
+    f.write(_HEAD)
+    f.write(f"""            <h1>🚀 ReVanced Pipeline Dashboard</h1>
+            <p>Last updated: {datetime.now():%Y-%m-%d %H:%M:%S}</p>
         </div>
         
         <div class="stats">
@@ -72,94 +181,44 @@ def generate_dashboard():
         
         <div class="section">
             <h2>📊 Recent Pipeline Runs</h2>
-"""
+""")
     
-    # Recent runs (last 10)
-    recent_runs = pipeline_history[-10:] if len(pipeline_history) >= 10 else pipeline_history
-    recent_runs.reverse()  # Most recent first
+    # Recent runs (last 10, most recent first)
+    recent_runs = reversed(pipeline_history[-10:])
     
-    for run in recent_runs:
-        timestamp = datetime.fromisoformat(run['timestamp']).strftime('%Y-%m-%d %H:%M')
-        status_class = run['status']
-        
-        summary = run.get('summary', {})
-        
-        html += f"""
-            <div class="run-item">
-                <div style="display: flex; justify-content: between; align-items: center;">
-                    <div style="flex: 1;">
-                        <strong>Run #{run['run_number']}</strong> - {timestamp}
-                        <span class="status {status_class}">{run['status'].upper()}</span>
-                    </div>
-                    <div style="text-align: right; font-size: 0.9em; color: #666;">
-                        Trigger: {run['trigger']} | Actor: {run['actor']}
-                    </div>
-                </div>
-"""
-        
-        if summary:
-            html += f"""
-                <div style="margin-top: 8px; font-size: 0.9em;">
-                    Downloads: {summary.get('downloads_successful', 0)} ✓, {summary.get('downloads_failed', 0)} ✗ | 
-                    Patches: {summary.get('patches_successful', 0)} ✓, {summary.get('patches_failed', 0)} ✗ | 
-                    Release: {'Yes' if summary.get('release_created') else 'No'}
-                </div>
-"""
-        
-        html += "</div>"
+    f.writelines(render_run_item(run) for run in recent_runs)
     
-    html += """
-        </div>
-        
-        <div class="section">
-            <h2>🎁 Recent Releases</h2>
-            <table>
-                <tr>
-                    <th>Tag</th>
-                    <th>Date</th>
-                    <th>Apps</th>
-                    <th>Size</th>
-                    <th>Architectures</th>
-                </tr>
-"""
+    f.write(_RELEASES_TABLE_HEAD)
     
-    # Recent releases (last 5)
-    recent_releases = release_history[-5:] if len(release_history) >= 5 else release_history
-    recent_releases.reverse()  # Most recent first
+    # Recent releases (last 5, most recent first)
+    recent_releases = reversed(release_history[-5:])
     
-    for release in recent_releases:
-        timestamp = datetime.fromisoformat(release['timestamp']).strftime('%Y-%m-%d')
-        
-        # Count unique apps
-        unique_apps = list(set(app['name'] for app in release['apps_released']))
-        app_count = len(unique_apps)
-        
-        # Architecture summary
-        arch_summary = []
-        for app_name, architectures in release['architecture_variants'].items():
-            arch_summary.append(f"{app_name} ({', '.join(architectures)})")
-        
-        html += f"""
-                <tr>
-                    <td><a href="{release.get('url', '#')}" target="_blank">{release['tag']}</a></td>
-                    <td>{timestamp}</td>
-                    <td>{app_count}</td>
-                    <td>{release['total_size_mb']} MB</td>
-                    <td>{"<br>".join(arch_summary)}</td>
-                </tr>
-"""
+    f.writelines(render_release_row(release) for release in recent_releases)
     
-    html += """
-            </table>
-        </div>
-    </div>
-</body>
-</html>"""
+    f.write(_FOOT)
+
+def generate_dashboard():
+    """Generate HTML dashboard"""
+    
+    # Load stats and histories concurrently (independent file reads)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        stats_future = executor.submit(get_pipeline_stats)
+        pipeline_future = executor.submit(load_pipeline_history)
+        release_future = executor.submit(load_release_history)
+        stats = stats_future.result()
+        pipeline_history = pipeline_future.result()
+        release_history = release_future.result()
     
-    # Save dashboard
+    # Stream dashboard to a temp file, then swap it into place atomically
     dashboard_path = Path("logs/dashboard.html")
-    with open(dashboard_path, 'w') as f:
-        f.write(html)
+    tmp_path = dashboard_path.with_suffix('.html.tmp')
+    with open(tmp_path, 'w', buffering=131072, encoding='utf-8') as f:
+        if not pipeline_history and not release_history:
+            # Nothing recorded yet - skip rendering entirely
+            f.write(_EMPTY_DASHBOARD_HTML)
+        else:
+            write_dashboard_body(f, stats, pipeline_history, release_history)
+    os.replace(tmp_path, dashboard_path)
     
     print(f"✓ Dashboard generated: {dashboard_path}")
     return dashboard_path
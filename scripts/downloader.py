@@ -4,20 +4,35 @@ Download APKs from APKMirror with proper parsing and architecture selection
 """
 
 import os
-import json
+import random
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 import time
 import re
+import shutil
+import sys
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
+from pipeline_logger import read_json_file, write_json_file
 
 try:
-    from bs4 import BeautifulSoup
+    from bs4 import BeautifulSoup, SoupStrainer
     BEAUTIFULSOUP_AVAILABLE = True
 except ImportError:
     print("⚠️  BeautifulSoup4 not installed. Please install it with: pip install beautifulsoup4")
     BEAUTIFULSOUP_AVAILABLE = False
 
+try:
+    import lxml  # noqa: F401 - only needed as the BeautifulSoup tree builder
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 try:
     from tqdm import tqdm
     TQDM_AVAILABLE = True
@@ -26,7 +41,7 @@ except ImportError:
     # Fallback progress function
     class tqdm:
         def __init__(self, **kwargs):
-            self.total = kwargs.get('total', 0)
+            self.total = kwargs.get('total') or 0
             self.desc = kwargs.get('desc', '')
             self.leave = kwargs.get('leave', True)
             self.n = 0
@@ -44,15 +59,171 @@ except ImportError:
             if not self.leave:
                 print()
 
+class LogProgress:
+    """Plain progress output for non-interactive runs (e.g. GitHub Actions logs)"""
+    
+    def __init__(self, total=None, desc='', step=5 * 1024 * 1024, **kwargs):
+        self.total = total or 0
+        self.desc = desc
+        self.step = step
+        self.n = 0
+        self.last_print = 0
+    
+    def update(self, n):
+        self.n += n
+        if self.n - self.last_print >= self.step:
+            self.last_print = self.n
+            if self.total > 0:
+                print(f"{self.desc} {self.n / 1e6:.1f}/{self.total / 1e6:.1f} MB")
+            else:
+                print(f"{self.desc} {self.n / 1e6:.1f} MB")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        pass
+
 DOWNLOADS_DIR = Path("downloads")
 DOWNLOADS_DIR.mkdir(exist_ok=True)
 
 CONFIG_FILE = Path("config/apps.json")
 
+MISSING_ARCH_LOG_FILE = DOWNLOADS_DIR / "missing_architectures.json"
+
+# Downloads are requested as if followed from an APKMirror page
+DOWNLOAD_REFERER_HEADER = {'Referer': 'https://www.apkmirror.com/'}
+
+# Large reads/writes keep per-chunk Python overhead low on big APKs
+DOWNLOAD_CHUNK_SIZE = 512 * 1024
+DOWNLOAD_WRITE_BUFFER = 1024 * 1024
+
+# Precompiled patterns for APKMirror page and URL parsing
+VERSION_CONTAINER_CLASS_RE = re.compile(r'version|release', re.I)
+TRIPLE_NUMBER_RE = re.compile(r'\d+[.-]\d+[.-]\d+')
+
+GOOGLE_PHOTOS_VERSION_RE = re.compile(r'google-photos-(\d+)-(\d+)-(\d+)-\d+-release')
+PHOTOS_VERSION_RE = re.compile(r'photos-(\d+)-(\d+)-(\d+)-\d+-release')
+DASHED_RELEASE_VERSION_RE = re.compile(r'-(\d+(?:-\d+)+)-release')
+NAMED_VERSION_RE = re.compile(r'/([^/]+)-(\d+(?:\.\d+)+(?:\.\d+)*(?:-release)?(?:\.0)*)')
+RELEASE_SUFFIX_RE = re.compile(r'-release.*')
+DOTTED_VERSION_RE = re.compile(r'(\d+\.\d+\.\d+(?:\.\d+)*)')
+DASHED_VERSION_RE = re.compile(r'-(\d+)-(\d+)-(\d+)(?:-(\d+))?-')
+
+NUMBERED_VARIANT_RE = re.compile(r'-[2-9]-android-apk-download')
+BUNDLE_INDICATOR_RE = re.compile(r'bundle|aab')  # also covers 'app bundle'
+APK_INDICATOR_RE = re.compile(r'apk|android package')
+
+# Keywords that mark an architecture's section on a version page
+ARCH_KEYWORDS = {
+    'armeabi-v7a': ('armeabi-v7a', 'armeabi'),
+    'arm64-v8a': ('arm64-v8a', 'arm64'),
+    'x86': ('x86',),
+    'x86_64': ('x86_64',),
+    'universal': ('universal', 'noarch')
+}
+
+# Strict per-link architecture markers for download link context
+ARMEABI_TEXT_VARIANTS = ('armeabi', 'armv7', 'arm-v7a')
+ARM64_TEXT_VARIANTS = ('arm64', 'aarch64')
+UNIVERSAL_TEXT_VARIANTS = ('universal', 'noarch', 'all-arch')
+
+# One alternation per architecture, matched against already-lowercased text.
+# Plain substrings cover the spelling variations; arm32 needs word boundaries.
+ARCH_TEXT_RE = {
+    'arm64-v8a': re.compile(r'arm64|aarch64'),
+    'armeabi-v7a': re.compile(r'armeabi|armv7|\barm32\b'),
+    'x86_64': re.compile(r'x86_64|x8664|x64|amd64|x86-64'),
+    'universal': re.compile(r'universal|noarch|all-arch|fat')
+}
+
+DOWNLOAD_BUTTON_CLASS_RE = re.compile(r'downloadButton', re.IGNORECASE)
+DOWNLOAD_APK_TEXT_RE = re.compile(r'download.*apk', re.IGNORECASE)
+DOWNLOAD_OR_PRIMARY_CLASS_RE = re.compile(r'download|btn-primary', re.IGNORECASE)
+DIRECT_APK_HREF_RE = re.compile(r'\.apk(?:\?.*)?$')
+
+# Fixed-literal href tests use plain string methods instead of regex.
+# BeautifulSoup calls these with None for tags lacking the attribute.
+def _is_apk_download_href(href):
+    return bool(href) and href.endswith(('-apk-download', '-apk-download/'))
+
+def _is_download_href(href):
+    return bool(href) and 'download' in href
+
+def _is_download_or_apk_href(href):
+    return bool(href) and ('download' in href or 'apk' in href)
+
+def _is_download_or_apk_file_href(href):
+    return bool(href) and ('download' in href or '.apk' in href)
+
+def _classify_download_variant(variant):
+    """('apk' | 'bundle' | 'other', debug line) for a version-page download link"""
+    url_lower = variant.get('url', '').lower()
+    
+    # APKMirror URL patterns for multiple variants:
+    # Bundle: /app-name-version-android-apk-download/ (first variant, no number)
+    # APK: /app-name-version-2-android-apk-download/ (second variant with "-2-")
+    # Numbered variants (like "-2-android-apk-download") are usually monolithic APKs
+    if NUMBERED_VARIANT_RE.search(url_lower):
+        return 'apk', f"        🔸 Classified as APK (variant number): {url_lower[-50:]}"
+    # First variant URLs (no single digit before android-apk-download) are usually bundles
+    if url_lower.endswith(('-android-apk-download', '-android-apk-download/')):
+        return 'bundle', f"        📦 Classified as Bundle (non-numbered): {url_lower[-50:]}"
+    
+    # Only build the combined text when the URL alone is inconclusive
+    combined_text = f"{variant.get('text', '')} {url_lower} {variant.get('context', '')}".lower()
+    
+    # Look for explicit Bundle indicators in text, then explicit APK indicators
+    if BUNDLE_INDICATOR_RE.search(combined_text):
+        return 'bundle', f"        📦 Classified as Bundle (text indicator): {combined_text[:50]}"
+    if APK_INDICATOR_RE.search(combined_text):
+        return 'apk', f"        🔸 Classified as APK (text indicator): {combined_text[:50]}"
+    return 'other', f"        ❓ Unclassified variant: {url_lower[-50:]}"
+
+def _is_release_href(href):
+    return bool(href) and href.endswith(('-release', '-release/'))
+
+FINAL_DOWNLOAD_HREF_PATTERNS = [
+    DIRECT_APK_HREF_RE.search,  # Direct APK links
+    lambda href: bool(href) and 'download.php' in href,  # Download script links
+    lambda href: bool(href) and 'getdownload' in href,  # Alternative download patterns
+]
+
+def flush_debug_lines(lines):
+    """Write buffered debug lines with a single stdout write"""
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+        lines.clear()
+
+def is_apk_response(response):
+    """Check response headers/URL for an APK file rather than an HTML page"""
+    content_type = response.headers.get('content-type', '').lower()
+    content_disposition = response.headers.get('content-disposition', '')
+    return ('application/vnd.android.package-archive' in content_type or
+            'application/octet-stream' in content_type or
+            '.apk' in content_disposition or
+            response.url.endswith('.apk'))
+
 def load_config():
     """Load app configuration"""
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
+    return read_json_file(CONFIG_FILE)
+
+def make_soup(response, parse_only=None):
+    """Parse an HTML response, skipping charset detection when the server declares one.
+    
+    parse_only takes a SoupStrainer to build only the elements a caller needs.
+    """
+    kwargs = {'parse_only': parse_only} if parse_only is not None else {}
+    content_type = response.headers.get('content-type', '').lower()
+    if 'charset=' in content_type and response.encoding:
+        kwargs['from_encoding'] = response.encoding
+    return BeautifulSoup(response.content, HTML_PARSER, **kwargs)
+
+if BEAUTIFULSOUP_AVAILABLE:
+    # Restrict parsing to the elements each page type actually reads
+    LINKS_ONLY = SoupStrainer('a', href=True)
+    DOWNLOAD_PAGE_ELEMENTS = SoupStrainer(['a', 'form'])
+    DOWNLOAD_REDIRECT_ELEMENTS = SoupStrainer(['a', 'meta'])
 
 class APKMirrorParser:
     """Parse APKMirror pages to find APK download links"""
@@ -60,6 +231,23 @@ class APKMirrorParser:
     def __init__(self):
         self.session = requests.Session()
         
+        # Keep-alive pool sized for concurrent version checks, with backoff on transient errors
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET', 'HEAD']
+        )
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # (app_url, hrefs) from the most recent get_all_version_pages call
+        self.last_app_page = None
+        
+        # Version page URLs that returned 404/410
+        self.missing_pages = set()
+        
         # Detect if running in GitHub Actions
         self.is_github_actions = bool(os.environ.get('GITHUB_ACTIONS'))
         
@@ -70,7 +258,6 @@ class APKMirrorParser:
             'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
         ]
         
-        import random
         selected_ua = random.choice(user_agents)
         
         self.session.headers.update({
@@ -88,48 +275,37 @@ class APKMirrorParser:
             response = self.session.get(app_url, timeout=30)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for ALL version links - multiple APKMirror patterns
-            version_links = []
-            
-            # Pattern 1: Standard release links
-            links1 = soup.find_all('a', href=re.compile(r'.*-release/$'))
-            version_links.extend(links1)
+            soup = make_soup(response)
             
-            # Pattern 2: Version-specific patterns
-            links2 = soup.find_all('a', href=re.compile(r'.*/[^/]+-\d+(?:[.-]\d+)*.*-release/$'))
-            version_links.extend(links2)
-            
-            # Pattern 3: Look in version listing tables/divs
-            version_divs = soup.find_all(['div', 'section'], class_=re.compile(r'.*version.*|.*release.*', re.I))
-            for div in version_divs:
-                div_links = div.find_all('a', href=re.compile(r'.*release.*'))
-                version_links.extend(div_links)
+            # Single pass over all links. Each link lands in the bucket of the first
+            # pattern it matches; buckets are concatenated so earlier patterns keep priority.
+            release_links = {}    # Pattern 1/2: release pages (versioned ones are a subset)
+            container_links = {}  # Pattern 3: release links inside version listing tables/divs
+            numbered_links = {}   # Pattern 4: any link with a version number in the URL
+            page_hrefs = []
+            for link in soup.find_all('a', href=True):
+                href = link['href']
+                if not href:
+                    continue
+                page_hrefs.append(href)
+                if href.endswith('-release/'):
+                    release_links[href] = None
+                elif 'release' in href and link.find_parent(['div', 'section'], class_=VERSION_CONTAINER_CLASS_RE):
+                    container_links[href] = None
+                elif TRIPLE_NUMBER_RE.search(href):
+                    numbered_links[href] = None
             
-            # Pattern 4: Look for any links with version patterns in the URL
-            all_links = soup.find_all('a', href=re.compile(r'.*\d+[.-]\d+[.-]\d+.*'))
-            for link in all_links:
-                href = link.get('href', '')
-                if 'release' in href or re.search(r'\d+[.-]\d+[.-]\d+', href):
-                    version_links.append(link)
+            # Remove duplicates (keep first occurrence) and process
+            unique_links = list(dict.fromkeys([*release_links, *container_links, *numbered_links]))
             
-            # Remove duplicates and process
-            seen_hrefs = set()
-            unique_links = []
-            for link in version_links:
-                href = link.get('href')
-                if href and href not in seen_hrefs:
-                    seen_hrefs.add(href)
-                    unique_links.append(link)
+            # Kept so troubleshooting output can inspect the page without re-fetching it
+            self.last_app_page = (app_url, page_hrefs)
             
             version_pages = []
-            for link in unique_links[:limit]:
-                href = link.get('href')
+            for href in unique_links[:limit]:
                 if href:
                     # Remove fragment identifiers
-                    if '#' in href:
-                        href = href.split('#')[0]
+                    href = href.partition('#')[0]
                     full_url = urljoin(app_url, href)
                     
                     # Extract version from URL
@@ -174,10 +350,21 @@ class APKMirrorParser:
             print(f"  ✗ Error getting version pages: {e}")
             return []
     
-    def _extract_version_from_url(self, url):
+    def prefetch_variants(self, version_pages, architectures, prefer_nodpi=True, max_workers=4):
+        """Fetch variants for several version pages concurrently, returning futures in page order"""
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = [
+            executor.submit(self._get_variants_from_version_page, vp['url'], architectures, prefer_nodpi)
+            for vp in version_pages
+        ]
+        # Queued fetches keep running; callers cancel the ones they no longer need
+        executor.shutdown(wait=False)
+        return futures
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _extract_version_from_url(url):
         """Extract version string from APKMirror URL - improved detection"""
-        import re
-        
         # APKMirror URLs can have various patterns:
         # /apk/google-inc/youtube/youtube-20-14-43-release/
         # /apk/google-inc/photos/google-photos-7-50-0-818774663-release/
@@ -185,35 +372,35 @@ class APKMirrorParser:
         # Pattern 1: Google Photos special patterns (with build number)
         if 'google-photos' in url or '/photos/' in url:
             # google-photos-7-50-0-818774663-release -> extract 7.50.0
-            version_match = re.search(r'google-photos-(\d+)-(\d+)-(\d+)-\d+-release', url)
+            version_match = GOOGLE_PHOTOS_VERSION_RE.search(url)
             if version_match:
                 return f"{version_match.group(1)}.{version_match.group(2)}.{version_match.group(3)}"
             
             # photos-5-64-0-405502726-release -> extract 5.64.0  
-            version_match = re.search(r'photos-(\d+)-(\d+)-(\d+)-\d+-release', url)
+            version_match = PHOTOS_VERSION_RE.search(url)
             if version_match:
                 return f"{version_match.group(1)}.{version_match.group(2)}.{version_match.group(3)}"
         
         # Pattern 2: Standard release pattern (most common)
-        version_match = re.search(r'-(\d+(?:-\d+)+)-release', url)
+        version_match = DASHED_RELEASE_VERSION_RE.search(url)
         if version_match:
             return version_match.group(1).replace('-', '.')
         
         # Pattern 3: Alternative patterns for different apps
-        version_match = re.search(r'/([^/]+)-(\d+(?:\.\d+)+(?:\.\d+)*(?:-release)?(?:\.0)*)', url)
+        version_match = NAMED_VERSION_RE.search(url)
         if version_match:
             version_part = version_match.group(2)
             # Clean up version string
-            version_part = re.sub(r'-release.*', '', version_part)
+            version_part = RELEASE_SUFFIX_RE.sub('', version_part)
             return version_part
         
         # Pattern 4: Direct version numbers
-        version_match = re.search(r'(\d+\.\d+\.\d+(?:\.\d+)*)', url)
+        version_match = DOTTED_VERSION_RE.search(url)
         if version_match:
             return version_match.group(1)
         
         # Pattern 4: Dash-separated numbers (convert to dots)
-        version_match = re.search(r'-(\d+)-(\d+)-(\d+)(?:-(\d+))?-', url)
+        version_match = DASHED_VERSION_RE.search(url)
         if version_match:
             groups = [g for g in version_match.groups() if g is not None]
             return '.'.join(groups)
@@ -224,18 +411,24 @@ class APKMirrorParser:
     
     def _get_variants_from_version_page(self, version_page_url, architectures, prefer_nodpi=True, debug=False):
         """Get real APK variants from a specific version page - simplified and more reliable"""
+        debug_lines = []  # per-link debug output, written in one go
         try:
             if debug or self.is_github_actions:
                 print(f"      🌐 Requesting page: {version_page_url}")
             
             response = self.session.get(version_page_url, timeout=45)  # Longer timeout for CI
+            if response.status_code in (404, 410):
+                # No such page (e.g. a constructed URL for an unlisted version) - not worth retrying
+                self.missing_pages.add(version_page_url)
+                return []
             response.raise_for_status()
             
             if response.status_code != 200:
                 raise Exception(f"HTTP {response.status_code}: {response.reason}")
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = make_soup(response)
             variants = []
+            seen_urls = set()
             
             if debug:
                 print(f"      🔍 Parsing version page for architecture-specific variants...")
@@ -245,22 +438,17 @@ class APKMirrorParser:
                 raise Exception("Invalid APKMirror page structure")
             
             # Method 1: Look for architecture names and their associated download links
-            arch_keywords = {
-                'armeabi-v7a': ['armeabi-v7a', 'armeabi'],
-                'arm64-v8a': ['arm64-v8a', 'arm64'],
-                'x86': ['x86'],
-                'x86_64': ['x86_64'],
-                'universal': ['universal', 'noarch']
-            }
+            # Walk the document's text nodes once, lowercasing each a single time
+            lowered_strings = [(text, text.lower()) for text in soup.find_all(string=True) if text]
             
             # Find elements containing architecture names
             for arch in architectures:
-                if arch not in arch_keywords:
+                if arch not in ARCH_KEYWORDS:
                     continue
                     
-                for keyword in arch_keywords[arch]:
+                for keyword in ARCH_KEYWORDS[arch]:
                     # Find elements containing this architecture keyword
-                    arch_elements = soup.find_all(string=lambda text: text and keyword in text.lower())
+                    arch_elements = [text for text, lowered in lowered_strings if keyword in lowered]
                     
                     for arch_element in arch_elements:
                         # Look for download links near this architecture element
@@ -272,43 +460,53 @@ class APKMirrorParser:
                             if not container:
                                 continue
                                 
-                            download_links = container.find_all('a', href=re.compile(r'.*-apk-download/?$'))
+                            download_links = container.find_all('a', href=_is_apk_download_href)
                             
                             for link in download_links:
                                 href = link.get('href', '')
-                                if href and not href.endswith('#disqus_thread'):  # Skip comment links
+                                if href:  # Comment links (#disqus_thread) never pass the href filter
                                     full_url = urljoin(version_page_url, href)
                                     
                                     # Avoid duplicates
-                                    if not any(v['url'] == full_url for v in variants):
-                                        variants.append({
-                                            'url': full_url,
-                                            'text': link.get_text(strip=True),
-                                            'architecture': arch,
-                                            'context': f'architecture_specific_{arch}'
-                                        })
-                                        
-                                        if debug:
-                                            print(f"      ✓ Found {arch} variant: {href}")
-                                        break  # Only take the first download link for this arch
+                                    if full_url in seen_urls:
+                                        continue
+                                    seen_urls.add(full_url)
+                                    variants.append({
+                                        'url': full_url,
+                                        'text': link.get_text(strip=True),
+                                        'architecture': arch,
+                                        'context': f'architecture_specific_{arch}'
+                                    })
+                                    
+                                    if debug:
+                                        debug_lines.append(f"      ✓ Found {arch} variant: {href}")
+                                    break  # Only take the first download link for this arch
                         
                         # Continue collecting all variants - don't break early
             
+            # Method 2 only adds links for architectures Method 1 hasn't already
+            # found a plain APK for (its numbered links are what let the filter
+            # below pick the APK over the bundle), and is skipped once all are.
+            # Links are still matched against every requested architecture, so
+            # a covered architecture's link isn't mistaken for universal.
+            covered = {v['architecture'] for v in variants if _classify_download_variant(v)[0] == 'apk'}
+            remaining_architectures = [arch for arch in architectures if arch not in covered]
+            
             # Method 2: Look for all download links and capture multiple variants per architecture
-            all_download_links = soup.find_all('a', href=re.compile(r'.*-apk-download/?$'))
+            all_download_links = soup.find_all('a', href=_is_apk_download_href) if remaining_architectures else []
             
             if debug:
-                print(f"      🔍 Checking {len(all_download_links)} download links for variants...")
+                debug_lines.append(f"      🔍 Checking {len(all_download_links)} download links for variants...")
             
             for link in all_download_links:
                 href = link.get('href', '')
                 text = link.get_text(strip=True)
                 
-                if href and not href.endswith('#disqus_thread'):
+                if href:
                     full_url = urljoin(version_page_url, href)
                     
                     # Skip if we already have this exact URL
-                    if any(v['url'] == full_url for v in variants):
+                    if full_url in seen_urls:
                         continue
                     
                     # Try to detect architecture from the URL or surrounding context
@@ -325,10 +523,10 @@ class APKMirrorParser:
                     # Detect architecture - STRICT MATCHING ONLY
                     arch_found = None
                     for arch in architectures:
-                        if arch == 'armeabi-v7a' and any(variant in full_text for variant in ['armeabi', 'armv7', 'arm-v7a']):
+                        if arch == 'armeabi-v7a' and any(variant in full_text for variant in ARMEABI_TEXT_VARIANTS):
                             arch_found = arch
                             break
-                        elif arch == 'arm64-v8a' and any(variant in full_text for variant in ['arm64', 'aarch64']):
+                        elif arch == 'arm64-v8a' and any(variant in full_text for variant in ARM64_TEXT_VARIANTS):
                             arch_found = arch
                             break
                         elif arch == 'x86_64' and 'x86_64' in full_text:
@@ -337,7 +535,7 @@ class APKMirrorParser:
                         elif arch == 'x86' and 'x86' in full_text and 'x86_64' not in full_text:
                             arch_found = arch
                             break
-                        elif arch == 'universal' and any(variant in full_text for variant in ['universal', 'noarch', 'all-arch']):
+                        elif arch == 'universal' and any(variant in full_text for variant in UNIVERSAL_TEXT_VARIANTS):
                             arch_found = arch
                             break
                     
@@ -345,7 +543,12 @@ class APKMirrorParser:
                     if not arch_found and 'universal' in architectures:
                         arch_found = 'universal'
                     
+                    # Method 1 already has a plain APK for this architecture
+                    if arch_found in covered:
+                        continue
+                    
                     if arch_found:
+                        seen_urls.add(full_url)
                         variants.append({
                             'url': full_url,
                             'text': text,
@@ -354,13 +557,14 @@ class APKMirrorParser:
                         })
                         
                         if debug:
-                            print(f"      ✓ Found {arch_found} variant: {href}")
+                            debug_lines.append(f"      ✓ Found {arch_found} variant: {href}")
                     else:
                         if debug:
-                            print(f"      ❌ Could not identify architecture for: {text[:30]}... (URL: {href[:50]}...)")
+                            debug_lines.append(f"      ❌ Could not identify architecture for: {text[:30]}... (URL: {href[:50]}...)")
             
             if debug:
-                print(f"      📦 Total variants found: {len(variants)}")
+                debug_lines.append(f"      📦 Total variants found: {len(variants)}")
+                flush_debug_lines(debug_lines)
             
             # Filter to prefer APK downloads over Bundle downloads
             if variants:
@@ -370,6 +574,7 @@ class APKMirrorParser:
             
         except Exception as e:
             if debug:
+                flush_debug_lines(debug_lines)
                 print(f"      ✗ Error parsing version page: {e}")
             return []
     
@@ -381,13 +586,12 @@ class APKMirrorParser:
         if not variants:
             return variants
         
+        debug_lines = []  # per-variant debug output, written in one go
+        
         # Group variants by architecture
-        arch_groups = {}
+        arch_groups = defaultdict(list)
         for variant in variants:
-            arch = variant.get('architecture', 'unknown')
-            if arch not in arch_groups:
-                arch_groups[arch] = []
-            arch_groups[arch].append(variant)
+            arch_groups[variant.get('architecture', 'unknown')].append(variant)
         
         filtered_variants = []
         
@@ -402,46 +606,16 @@ class APKMirrorParser:
             bundle_variants = []
             other_variants = []
             
+            groups = {'apk': apk_variants, 'bundle': bundle_variants, 'other': other_variants}
             for variant in arch_variants:
-                text_lower = variant.get('text', '').lower()
-                url_lower = variant.get('url', '').lower()
-                context_lower = variant.get('context', '').lower()
-                
-                combined_text = f"{text_lower} {url_lower} {context_lower}"
-                
-                # APKMirror URL patterns for multiple variants:
-                # Bundle: /app-name-version-android-apk-download/ (first variant, no number)
-                # APK: /app-name-version-2-android-apk-download/ (second variant with "-2-")
-                
-                # Look for variant URLs with single digits before android-apk-download (like "-2-android-apk-download")
-                # These are usually monolithic APKs (second, third variants)
-                if re.search(r'-[2-9]-android-apk-download', url_lower):
-                    apk_variants.append(variant)
-                    if debug:
-                        print(f"        🔸 Classified as APK (variant number): {url_lower[-50:]}")
-                # Look for first variant URLs (no single digit before android-apk-download)
-                # These are usually bundles  
-                elif re.search(r'-android-apk-download/?$', url_lower) and not re.search(r'-[2-9]-android-apk-download', url_lower):
-                    bundle_variants.append(variant)
-                    if debug:
-                        print(f"        📦 Classified as Bundle (non-numbered): {url_lower[-50:]}")
-                # Look for explicit Bundle indicators in text
-                elif any(indicator in combined_text for indicator in ['bundle', 'aab', 'app bundle']):
-                    bundle_variants.append(variant)
-                    if debug:
-                        print(f"        📦 Classified as Bundle (text indicator): {combined_text[:50]}")
-                # Look for explicit APK indicators
-                elif any(indicator in combined_text for indicator in ['apk', 'android package']):
-                    apk_variants.append(variant)
-                    if debug:
-                        print(f"        🔸 Classified as APK (text indicator): {combined_text[:50]}")
-                # Fallback to other
-                else:
-                    other_variants.append(variant)
-                    if debug:
-                        print(f"        ❓ Unclassified variant: {url_lower[-50:]}")
+                kind, debug_line = _classify_download_variant(variant)
+                groups[kind].append(variant)
+                if debug:
+                    debug_lines.append(debug_line)
             
             # Prefer APK over Bundle over Other
+            if debug:
+                flush_debug_lines(debug_lines)
             if apk_variants:
                 if debug:
                     print(f"      🎯 Preferring APK download for {arch} (found {len(apk_variants)} APK vs {len(bundle_variants)} Bundle)")
@@ -479,8 +653,13 @@ class APKMirrorParser:
         context_texts = [elem.get_text(strip=True) for elem in context_elements]
         return ' '.join(context_texts)
     
-    def _extract_architecture_info(self, text, href, context_text, architectures):
-        """Extract architecture information from text, URL, and context - STRICT matching only"""
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _extract_architecture_info(text, href, context_text, architectures):
+        """Extract architecture information from text, URL, and context - STRICT matching only
+        
+        Results are memoized, so architectures must be passed as a tuple.
+        """
         combined_text = (text + ' ' + href + ' ' + context_text).lower()
         
         # Only check for EXPLICIT architecture mentions - no guessing!
@@ -492,36 +671,12 @@ class APKMirrorParser:
                 return arch
         
         # 2. Check for architecture variations in the combined text
-        arch_variations = {
-            'arm64-v8a': ['arm64-v8a', 'arm64v8a', 'arm64', 'aarch64'],
-            'armeabi-v7a': ['armeabi-v7a', 'armeabiv7a', 'armeabi', 'armv7a', 'armv7'],
-            'x86_64': ['x86_64', 'x8664', 'x64', 'amd64', 'x86-64'],
-            'universal': ['universal', 'noarch', 'all-arch', 'fat']
-        }
-        
-        for arch in architectures:
-            if arch in arch_variations:
-                for variation in arch_variations[arch]:
-                    if variation in combined_text:
-                        return arch
-        
-        # 3. Check for architecture indicators in URL structure
-        # APKMirror sometimes uses patterns like "arm64" in the download path
-        import re
-        arch_patterns = {
-            'arm64-v8a': [r'\barm64\b', r'\baarch64\b'],
-            'armeabi-v7a': [r'\barmeabi\b', r'\barmv7\b', r'\barm32\b'],
-            'x86_64': [r'\bx86_64\b', r'\bx64\b', r'\bamd64\b'],
-            'universal': [r'\buniversal\b', r'\bnoarch\b']
-        }
-        
         for arch in architectures:
-            if arch in arch_patterns:
-                for pattern in arch_patterns[arch]:
-                    if re.search(pattern, combined_text, re.IGNORECASE):
-                        return arch
+            arch_re = ARCH_TEXT_RE.get(arch)
+            if arch_re and arch_re.search(combined_text):
+                return arch
         
-        # 4. NO FALLBACK to 'universal' - only return if explicitly found
+        # 3. NO FALLBACK to 'universal' - only return if explicitly found
         return None
     
     def _get_variants_from_subpage(self, subpage_url, architectures, prefer_nodpi, debug):
@@ -530,24 +685,24 @@ class APKMirrorParser:
             response = self.session.get(subpage_url, timeout=30)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = make_soup(response, parse_only=LINKS_ONLY)
             variants = []
             
             if debug:
                 print(f"      🔍 Checking subpage: {subpage_url}")
             
             # Look for download links on this subpage
-            download_links = soup.find_all('a', href=re.compile(r'.*(?:download|apk).*'))
+            download_links = soup.find_all('a', href=_is_download_or_apk_href)
             
             for link in download_links:
                 href = link.get('href')
                 text = link.get_text(strip=True)
                 
-                if not href or any(skip in href for skip in ['#', 'javascript:', 'mailto:']):
+                if not href or any(skip in href for skip in ('#', 'javascript:', 'mailto:')):
                     continue
                 
                 # Check if this looks like an architecture-specific variant
-                arch_found = self._extract_architecture_info(text, href, '', architectures)
+                arch_found = self._extract_architecture_info(text, href, '', tuple(architectures))
                 
                 if arch_found:
                     full_url = urljoin(subpage_url, href)
@@ -570,6 +725,17 @@ class APKMirrorParser:
                 print(f"      ✗ Error parsing subpage: {e}")
             return []
     
+    def _probe_apk_url(self, url):
+        """Return the final URL if it serves an APK, without downloading the body"""
+        response = self.session.head(url, timeout=30, allow_redirects=True)
+        if response.status_code in (405, 501):
+            # HEAD not supported - ask for a single byte instead
+            response = self.session.get(url, timeout=30, allow_redirects=True, stream=True,
+                                        headers={'Range': 'bytes=0-0'})
+        response.close()
+        response.raise_for_status()
+        return response.url if is_apk_response(response) else None
+    
     def get_direct_download_link(self, variant_page_url, debug=False):
         """Get the direct download link from variant/APK page through APKMirror's multi-step process"""
         try:
@@ -580,7 +746,7 @@ class APKMirrorParser:
             response = self.session.get(variant_page_url, timeout=30)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = make_soup(response, parse_only=DOWNLOAD_PAGE_ELEMENTS)
             
             # APKMirror has a specific download process:
             # 1. The APK page has a "Download APK" button
@@ -591,16 +757,16 @@ class APKMirrorParser:
             download_button = None
             
             # Pattern 1: Look for the specific download APK button
-            download_button = soup.find('a', class_=re.compile(r'.*downloadButton.*', re.IGNORECASE))
+            download_button = soup.find('a', class_=DOWNLOAD_BUTTON_CLASS_RE)
             if not download_button:
                 # Pattern 2: Look for button with "Download APK" text
-                download_button = soup.find('a', string=re.compile(r'.*download.*apk.*', re.IGNORECASE))
+                download_button = soup.find('a', string=DOWNLOAD_APK_TEXT_RE)
             if not download_button:
                 # Pattern 3: Look for any prominent download link
-                download_button = soup.find('a', class_=re.compile(r'.*(download|btn-primary).*', re.IGNORECASE))
+                download_button = soup.find('a', class_=DOWNLOAD_OR_PRIMARY_CLASS_RE)
             if not download_button:
                 # Pattern 4: Look for link with specific download href pattern
-                download_button = soup.find('a', href=re.compile(r'.*download.*'))
+                download_button = soup.find('a', href=_is_download_href)
             
             if debug and download_button:
                 print(f"      📋 Found download button: {download_button.get_text(strip=True)}")
@@ -641,7 +807,7 @@ class APKMirrorParser:
                         download_url = variant_page_url  # Submit to same page
                 else:
                     # Look for any other download links on the page
-                    other_links = soup.find_all('a', href=re.compile(r'.*(?:download|\.apk).*'))
+                    other_links = soup.find_all('a', href=_is_download_or_apk_file_href)
                     if other_links:
                         download_href = other_links[0].get('href')
                         download_url = urljoin(variant_page_url, download_href)
@@ -660,43 +826,56 @@ class APKMirrorParser:
             # Step 2: Follow the download URL
             # For APKMirror, this might require posting form data or handling redirects
             try:
+                # Links that already point at an .apk file only need their headers checked
+                if urlparse(download_url).path.endswith('.apk'):
+                    apk_url = self._probe_apk_url(download_url)
+                    if apk_url:
+                        if debug:
+                            print(f"      ✓ Direct APK download found: {apk_url}")
+                        return apk_url
+                
                 # Try GET first
-                response2 = self.session.get(download_url, timeout=30, allow_redirects=True)
+                # Stream so an APK body isn't pulled into memory just to inspect its headers
+                response2 = self.session.get(download_url, timeout=30, allow_redirects=True, stream=True)
                 response2.raise_for_status()
                 
                 # Check if this is the actual APK file
                 content_type = response2.headers.get('content-type', '').lower()
-                content_disposition = response2.headers.get('content-disposition', '')
                 
-                if ('application/vnd.android.package-archive' in content_type or 
-                    'application/octet-stream' in content_type or
-                    '.apk' in content_disposition or
-                    response2.url.endswith('.apk')):
+                if is_apk_response(response2):
                     if debug:
                         print(f"      ✓ Direct APK download found: {response2.url}")
+                    response2.close()
                     return response2.url
                 
                 # If not APK, parse the page for final download link
-                soup2 = BeautifulSoup(response2.content, 'html.parser')
+                soup2 = make_soup(response2, parse_only=DOWNLOAD_REDIRECT_ELEMENTS)
                 
-                # Look for the final download link patterns
-                final_patterns = [
-                    r'.*\.apk(\?.*)?$',  # Direct APK links
-                    r'.*download\.php.*',  # Download script links
-                    r'.*getdownload.*',  # Alternative download patterns
-                ]
+                # One pass over anchors and meta tags: keep the first link for each
+                # final download pattern, and the first meta refresh
+                final_hrefs = [None] * len(FINAL_DOWNLOAD_HREF_PATTERNS)
+                meta_refresh = None
+                for element in soup2.find_all(['a', 'meta']):
+                    if element.name == 'meta':
+                        if meta_refresh is None and element.get('http-equiv') == 'refresh':
+                            meta_refresh = element
+                        continue
+                    href = element.get('href')
+                    if not href:
+                        continue
+                    for rank, pattern in enumerate(FINAL_DOWNLOAD_HREF_PATTERNS):
+                        if final_hrefs[rank] is None and pattern(href):
+                            final_hrefs[rank] = href
                 
-                for pattern in final_patterns:
-                    final_links = soup2.find_all('a', href=re.compile(pattern))
-                    if final_links:
-                        final_href = final_links[0].get('href')
-                        final_url = urljoin(download_url, final_href)
-                        if debug:
-                            print(f"      ✓ Final APK URL found: {final_url}")
-                        return final_url
+                # Patterns are in order of preference
+                final_href = next((href for href in final_hrefs if href), None)
+                if final_href:
+                    final_url = urljoin(download_url, final_href)
+                    if debug:
+                        print(f"      ✓ Final APK URL found: {final_url}")
+                    return final_url
                 
                 # Look for auto-redirect meta tags
-                meta_refresh = soup2.find('meta', attrs={'http-equiv': 'refresh'})
                 if meta_refresh:
                     content = meta_refresh.get('content', '')
                     if 'url=' in content.lower():
@@ -734,14 +913,29 @@ def load_patch_analysis():
     """Load the patch analysis results"""
     analysis_file = Path("downloads/patch_analysis.json")
     if analysis_file.exists():
-        with open(analysis_file, 'r') as f:
-            return json.load(f)
+        return read_json_file(analysis_file)
     return {}
 
-def download_single_apk(download_url, output_path, max_retries=3, retry_delay=5):
-    """Download a single APK file with progress bar and retry logic"""
+class ProgressReader:
+    """Readable wrapper that reports each block read to a progress bar"""
+    
+    def __init__(self, raw, pbar):
+        self.raw = raw
+        self.pbar = pbar
     
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        if data:
+            self.pbar.update(len(data))
+        return data
+
+@functools.lru_cache(maxsize=1)
+def get_download_session():
+    """Shared keep-alive session for APK downloads made without a parser session"""
     session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
     session.headers.update({
         'User-Agent': (
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -749,38 +943,54 @@ def download_single_apk(download_url, output_path, max_retries=3, retry_delay=5)
             'Chrome/118.0.0.0 Safari/537.36'
         ),
         'Accept-Language': 'en-US,en;q=0.9',
-        'Referer': 'https://www.apkmirror.com/',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Connection': 'keep-alive',
     })
+    return session
+
+def download_single_apk(download_url, output_path, max_retries=3, retry_delay=5, session=None):
+    """Download a single APK file with progress bar and retry logic
+    
+    Pass the parser's session to reuse its pooled connections to APKMirror.
+    """
+    if session is None:
+        session = get_download_session()
     
     for attempt in range(max_retries):
         try:
-            response = session.get(download_url, stream=True, timeout=60)
+            response = session.get(download_url, stream=True, timeout=60, headers=DOWNLOAD_REFERER_HEADER)
             response.raise_for_status()
             
             total_size = int(response.headers.get('content-length', 0))
             
-            with open(output_path, 'wb') as f:
-                if total_size > 0:
-                    with tqdm(
-                        total=total_size,
-                        unit='B',
-                        unit_scale=True,
-                        desc=f"  {output_path.name}",
-                        leave=False
-                    ) as pbar:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                                pbar.update(len(chunk))
-                else:
-                    f.write(response.content)
+            # Always stream to disk, even when the server omits content-length
+            raw = response.raw
+            raw.decode_content = True  # undo any transfer compression like iter_content would
+            with open(output_path, 'wb', buffering=DOWNLOAD_WRITE_BUFFER) as f:
+                # Redrawing a bar is wasted work when nobody is watching a terminal
+                progress = tqdm if sys.stderr.isatty() else LogProgress
+                with progress(
+                    total=total_size or None,
+                    unit='B',
+                    unit_scale=True,
+                    desc=f"  {output_path.name}",
+                    leave=False,
+                    mininterval=0.5
+                ) as pbar:
+                    # copyfileobj moves large blocks in C; the reader only reports progress
+                    shutil.copyfileobj(ProgressReader(raw, pbar), f, DOWNLOAD_CHUNK_SIZE)
             
             return True
             
-        except requests.RequestException as e:
+        # Reading response.raw directly surfaces urllib3's own errors (e.g. a
+        # connection dropped mid-file) rather than requests' wrapped ones
+        except (requests.RequestException, Urllib3HTTPError, OSError) as e:
             print(f"✗ Attempt {attempt + 1} failed: {e}")
+            # Never leave a truncated APK behind for later steps to pick up
+            try:
+                output_path.unlink(missing_ok=True)
+            except OSError:
+                pass
             if attempt < max_retries - 1:
                 print(f"  Retrying in {retry_delay} seconds...")
                 time.sleep(retry_delay)
@@ -792,14 +1002,65 @@ def download_single_apk(download_url, output_path, max_retries=3, retry_delay=5)
 
 
 
-def download_app_apks(app, settings):
+def fetch_variant_apk(parser, variant, output_path, max_retries=3, retry_delay=5):
+    """Resolve a variant's direct download link and download it, returning True on success"""
+    filename = output_path.name
+    print(f"    ⬇️  Downloading {filename}...")
+    
+    # Get download link with retry logic
+    direct_link = None
+    for link_attempt in range(max_retries):
+        try:
+            direct_link = parser.get_direct_download_link(variant['url'], debug=False)
+            if direct_link:
+                break
+        except Exception as e:
+            # Check if it's a rate limiting error
+            if "429" in str(e) or "Too Many Requests" in str(e):
+                if link_attempt < max_retries - 1:
+                    print(f"    🔄 Rate limited, retrying in {retry_delay}s... (attempt {link_attempt + 1}/{max_retries})")
+                    time.sleep(retry_delay)
+                    continue
+                else:
+                    print(f"    ✗ Rate limit exceeded after {max_retries} attempts")
+            else:
+                print(f"    ✗ Error getting download link: {e}")
+            break
+    
+    if not direct_link:
+        print(f"    ✗ Could not get download link for {variant['architecture']}")
+        return False
+    
+    # Download
+    success = download_single_apk(direct_link, output_path, max_retries, retry_delay, session=parser.session)
+    
+    if success:
+        print(f"    ✓ Downloaded {filename}")
+    else:
+        print(f"    ✗ Failed to download {filename}")
+        if output_path.exists():
+            output_path.unlink()
+    return success
+
+def load_missing_architectures_log():
+    """Load the missing architectures log (a JSON list of entries)"""
+    if MISSING_ARCH_LOG_FILE.exists():
+        return read_json_file(MISSING_ARCH_LOG_FILE)
+    return []
+
+def download_app_apks(app, settings, patch_analysis=None, parser=None, missing_log=None):
     """
     Download APKs for an app - targeting specific ReVanced-supported versions
     Only downloads explicitly identified architecture variants - NO GUESSING!
+    
+    main() passes in the patch analysis, a shared parser and the missing
+    architectures log so they are loaded/created once per run rather than
+    once per app.
     """
 
     # Load patch analysis to get supported versions
-    patch_analysis = load_patch_analysis()
+    if patch_analysis is None:
+        patch_analysis = load_patch_analysis()
     package_name = app['package_name']
     
     if package_name in patch_analysis:
@@ -820,12 +1081,14 @@ def download_app_apks(app, settings):
         recommended_version = None
         supports_any_version = False
     
-    parser = APKMirrorParser()
+    if parser is None:
+        parser = APKMirrorParser()
     architectures = settings.get('architectures', ['armeabi-v7a', 'arm64-v8a', 'x86_64', 'universal'])
     prefer_nodpi = settings.get('prefer_nodpi', True)
     download_multiple = settings.get('download_multiple_architectures', True)
     max_retries = settings.get('max_retries', 3)
     retry_delay = settings.get('retry_delay', 5)
+    max_parallel_downloads = settings.get('max_parallel_downloads', 2)
     
     # Create app-specific directory
     app_dir = DOWNLOADS_DIR / app['package_name']
@@ -878,19 +1141,24 @@ def download_app_apks(app, settings):
         if not version_pages and app['name'] == 'Google Photos':
             print("  🔍 Debug: Testing Google Photos page parsing...")
             try:
-                response = parser.session.get(app['download_url'], timeout=30)
-                if response.status_code == 200:
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    release_links = soup.find_all('a', href=re.compile(r'.*-release/?$'))
-                    print(f"    📋 Found {len(release_links)} total release links")
-                    if release_links:
-                        for i, link in enumerate(release_links[:3]):
-                            href = link.get('href')
-                            version = parser._extract_version_from_url(href)
-                            print(f"    📄 Link {i+1}: {href} -> version {version}")
+                # Reuse the links already collected from the app page when available
+                if parser.last_app_page and parser.last_app_page[0] == app['download_url']:
+                    page_hrefs = parser.last_app_page[1]
                 else:
-                    print(f"    ❌ HTTP {response.status_code} when accessing page")
+                    response = parser.session.get(app['download_url'], timeout=30)
+                    if response.status_code == 200:
+                        soup = make_soup(response, parse_only=LINKS_ONLY)
+                        page_hrefs = [link['href'] for link in soup.find_all('a', href=True)]
+                    else:
+                        page_hrefs = None
+                        print(f"    ❌ HTTP {response.status_code} when accessing page")
+                
+                if page_hrefs is not None:
+                    release_hrefs = [href for href in page_hrefs if _is_release_href(href)]
+                    print(f"    📋 Found {len(release_hrefs)} total release links")
+                    for i, href in enumerate(release_hrefs[:3]):
+                        version = parser._extract_version_from_url(href)
+                        print(f"    📄 Link {i+1}: {href} -> version {version}")
             except Exception as e:
                 print(f"    ❌ Debug error: {e}")
         
@@ -905,7 +1173,18 @@ def download_app_apks(app, settings):
         print(f"  🔍 Constructing direct URLs for supported versions...")
         
         version_pages = []
-        for version in supported_versions:
+        
+        # Extract app name from base URL
+        # https://www.apkmirror.com/apk/google-inc/youtube/ -> youtube
+        app_name = app['download_url'].rstrip('/').split('/')[-1]
+        
+        # Try the recommended version first
+        ordered_versions = list(supported_versions)
+        if recommended_version in ordered_versions:
+            ordered_versions.remove(recommended_version)
+            ordered_versions.insert(0, recommended_version)
+        
+        for version in ordered_versions:
             # Skip "any" markers
             if version == "any":
                 continue
@@ -914,10 +1193,6 @@ def download_app_apks(app, settings):
             # Convert version format: 20.14.43 -> youtube-20-14-43-release
             version_parts = version.replace('.', '-')
             
-            # Extract app name from base URL
-            # https://www.apkmirror.com/apk/google-inc/youtube/ -> youtube
-            app_name = app['download_url'].rstrip('/').split('/')[-1]
-            
             # Construct the release URL
             version_url = f"{app['download_url']}{app_name}-{version_parts}-release/"
             
@@ -962,13 +1237,34 @@ def download_app_apks(app, settings):
         
         print(f"  📄 Found {len(version_pages)} versions to check")
     
+    # Drop duplicate version page URLs (keep first occurrence)
+    unique_pages = {}
+    for version_info in version_pages:
+        unique_pages.setdefault(version_info['url'], version_info)
+    version_pages = list(unique_pages.values())
+    
     # Track what we've successfully found and downloaded
     found_variants = {}
+    requested_architectures = set(architectures)
+    needed_architectures = set(requested_architectures)  # shrinks as variants are found
     
 
     
+    # Fetch version pages concurrently (bounded pool to stay polite to APKMirror);
+    # results are consumed in order below so the early-stop logic is unchanged.
+    # A known recommended version is probed alone first, since finding it ends
+    # the search - the alternates are only fetched if it falls short.
+    max_parallel = settings.get('max_parallel_version_checks', 4)
+    # (version_pages can be empty here when every supported version is an 'any' marker)
+    recommended_first = bool(recommended_version) and bool(version_pages) and version_pages[0]['version'] == recommended_version
+    first_batch = version_pages[:1] if recommended_first else version_pages
+    variant_futures = parser.prefetch_variants(first_batch, architectures, prefer_nodpi, max_parallel)
+    
     # Check each version for real architecture variants
-    for version_info in version_pages:
+    for index, version_info in enumerate(version_pages):
+        if index == len(variant_futures):
+            variant_futures += parser.prefetch_variants(version_pages[index:], architectures, prefer_nodpi, max_parallel)
+        variant_future = variant_futures[index]
         version_url = version_info['url']
         version_str = version_info['version']
         
@@ -978,15 +1274,6 @@ def download_app_apks(app, settings):
         else:
             print(f"  🔍 Checking version {version_str} (latest available)...")
         
-        # Add delay to avoid rate limiting - longer delays in GitHub Actions
-        if parser.is_github_actions:
-            delay = settings.get('retry_delay', 5)
-        else:
-            delay = 1  # Normal delay for local
-        
-        print(f"    ⏱️  Waiting {delay}s to avoid rate limiting...")
-        time.sleep(delay)
-        
         # Get variants from this version with retry logic
         variants = None
         configured_max_retries = settings.get('max_retries', 3)
@@ -994,8 +1281,11 @@ def download_app_apks(app, settings):
         
         for retry in range(max_variant_retries):
             try:
-                variants = parser._get_variants_from_version_page(version_url, architectures, prefer_nodpi, debug=False)
-                if variants:
+                if retry == 0:
+                    variants = variant_future.result()
+                else:
+                    variants = parser._get_variants_from_version_page(version_url, architectures, prefer_nodpi, debug=False)
+                if variants or version_url in parser.missing_pages:
                     break
                 elif retry < max_variant_retries - 1:
                     configured_retry_delay = settings.get('retry_delay', 5)
@@ -1023,11 +1313,12 @@ def download_app_apks(app, settings):
         if variants:
             print(f"    📦 Found {len(variants)} real variants in v{version_str}")
             
+            pending_downloads = {}
             for variant in variants:
                 arch = variant['architecture']
                 
                 # Only download if we haven't found this architecture yet
-                if arch not in found_variants:
+                if arch not in found_variants and arch not in pending_downloads:
                     filename = f"{app['package_name']}-v{version_str}-{arch}.apk"
                     output_path = app_dir / filename
                     
@@ -1035,54 +1326,35 @@ def download_app_apks(app, settings):
                     if output_path.exists():
                         print(f"    ✓ {filename} already exists")
                         found_variants[arch] = str(output_path)
+                        needed_architectures.discard(arch)
                         downloaded_files.append(str(output_path))
                         continue
                     
-                    print(f"    ⬇️  Downloading {filename}...")
-                    
-                    # Get download link with retry logic
-                    direct_link = None
-                    for link_attempt in range(max_retries):
-                        try:
-                            direct_link = parser.get_direct_download_link(variant['url'], debug=False)
-                            if direct_link:
-                                break
-                        except Exception as e:
-                            # Check if it's a rate limiting error
-                            if "429" in str(e) or "Too Many Requests" in str(e):
-                                if link_attempt < max_retries - 1:
-                                    print(f"    🔄 Rate limited, retrying in {retry_delay}s... (attempt {link_attempt + 1}/{max_retries})")
-                                    time.sleep(retry_delay)
-                                    continue
-                                else:
-                                    print(f"    ✗ Rate limit exceeded after {max_retries} attempts")
-                            else:
-                                print(f"    ✗ Error getting download link: {e}")
-                            break
-                    
-                    if not direct_link:
-                        print(f"    ✗ Could not get download link for {arch}")
-                        continue
-                    
-                    # Download
-                    success = download_single_apk(direct_link, output_path, max_retries, retry_delay)
-                    
-                    if success:
-                        print(f"    ✓ Downloaded {filename}")
-                        
-                        found_variants[arch] = str(output_path)
-                        downloaded_files.append(str(output_path))
-                    else:
-                        print(f"    ✗ Failed to download {filename}")
-                        if output_path.exists():
-                            output_path.unlink()
+                    pending_downloads[arch] = (variant, output_path)
                 else:
                     print(f"    ⚠️  No variants found in v{version_str} - checking next version...")
+            
+            # Resolve links and download the remaining architectures concurrently
+            if pending_downloads:
+                with ThreadPoolExecutor(max_workers=max_parallel_downloads) as executor:
+                    download_futures = {
+                        arch: executor.submit(fetch_variant_apk, parser, variant, output_path, max_retries, retry_delay)
+                        for arch, (variant, output_path) in pending_downloads.items()
+                    }
+                
+                for arch, download_future in download_futures.items():
+                    if download_future.result():
+                        output_path = pending_downloads[arch][1]
+                        found_variants[arch] = str(output_path)
+                        needed_architectures.discard(arch)
+                        downloaded_files.append(str(output_path))
+        elif version_url in parser.missing_pages:
+            print(f"    ❌ No version page for v{version_str} on APKMirror")
         else:
             print(f"    ❌ No real variants found in v{version_str}")
         
         # Stop if we've found all requested architectures or we found the recommended version
-        if not download_multiple or len(found_variants) >= len(architectures):
+        if not download_multiple or not needed_architectures:
             break
         
         # Also stop if we successfully downloaded the recommended version
@@ -1090,10 +1362,13 @@ def download_app_apks(app, settings):
             print(f"  🎯 Successfully downloaded recommended version {recommended_version}")
             break
     
+    # Drop any version page fetches that haven't started yet
+    for variant_future in variant_futures:
+        variant_future.cancel()
+    
     # Check for missing architectures and log them
-    requested_architectures = set(architectures)
-    found_architectures = set(found_variants.keys())
-    missing_architectures = requested_architectures - found_architectures
+    found_architectures = set(found_variants)
+    missing_architectures = needed_architectures
     
     if missing_architectures:
         print(f"  ⚠️  Missing architectures: {list(missing_architectures)}")
@@ -1110,19 +1385,15 @@ def download_app_apks(app, settings):
         }
         
         # Append to missing architectures log
-        missing_log_file = DOWNLOADS_DIR / "missing_architectures.json"
-        if missing_log_file.exists():
-            with open(missing_log_file, 'r') as f:
-                missing_log = json.load(f)
+        if missing_log is not None:
+            # Caller holds the log in memory and writes it once at the end
+            missing_log.append(missing_info)
+            print(f"  📝 Missing architecture info recorded for: {MISSING_ARCH_LOG_FILE}")
         else:
-            missing_log = []
-        
-        missing_log.append(missing_info)
-        
-        with open(missing_log_file, 'w') as f:
-            json.dump(missing_log, f, indent=2)
-        
-        print(f"  📝 Missing architecture info logged to: {missing_log_file}")
+            missing_log = load_missing_architectures_log()
+            missing_log.append(missing_info)
+            write_json_file(MISSING_ARCH_LOG_FILE, missing_log)
+            print(f"  📝 Missing architecture info logged to: {MISSING_ARCH_LOG_FILE}")
     
     # Summary
     if found_variants:
@@ -1171,10 +1442,16 @@ def main():
         
         print(f"\n📱 Processing {len(enabled_apps)} enabled apps...\n")
         
+        # Shared across apps: one analysis load, one parser session/connection pool
+        patch_analysis = load_patch_analysis()
+        parser = APKMirrorParser()
+        missing_log = load_missing_architectures_log()
+        missing_log_size = len(missing_log)
+        
         for i, app in enumerate(enabled_apps, 1):
             print(f"\n 📱 [{i}/{len(enabled_apps)}] {app['name']} - Processing...")
             
-            success, paths = download_app_apks(app, settings)
+            success, paths = download_app_apks(app, settings, patch_analysis, parser, missing_log)
             
             if success:
                 results['successful'].append({
@@ -1190,10 +1467,14 @@ def main():
                 })
                 print(f"  ❌ Failed to download any APKs")
         
+        # Persist missing architecture entries in a single write
+        if len(missing_log) > missing_log_size:
+            write_json_file(MISSING_ARCH_LOG_FILE, missing_log)
+            print(f"\n📝 Missing architecture info logged to: {MISSING_ARCH_LOG_FILE}")
+        
         # Save results for next step
         results_file = Path("downloads/download_results.json")
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        write_json_file(results_file, results)
         
         # Summary
         total_apks = sum(item.get('count', 0) for item in results['successful'])
@@ -1238,6 +1519,5 @@ def main():
         return 1  # Critical script error
 
 if __name__ == "__main__":
-    import sys
     exit_code = main()
     sys.exit(exit_code)
\ No newline at end of file
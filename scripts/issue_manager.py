@@ -8,7 +8,7 @@ import json
 import sys
 import argparse
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from github import Github
 
 OUTPUT_DIR = Path("output")
@@ -219,7 +219,7 @@ def handle_download_failures():
     g = Github(github_token)
     repo = g.get_repo(os.environ.get('GITHUB_REPOSITORY', ''))
     
-    date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
+    date_str = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
     
     print(f"Creating issues for {len(results['failed'])} download failures...")
     
@@ -253,7 +253,7 @@ def handle_patch_failures():
     g = Github(github_token)
     repo = g.get_repo(os.environ.get('GITHUB_REPOSITORY', ''))
     
-    date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
+    date_str = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
     
     print(f"Creating issues for {len(results['failed'])} patch failures...")
     
@@ -3,16 +3,31 @@
 Analyze ReVanced patches to determine supported app versions
 """
 
-import json
 import subprocess
+import tempfile
 import re
 from pathlib import Path
+from pipeline_logger import read_json_file, write_json_file
 
 REVANCED_DIR = Path("revanced")
 CONFIG_FILE = Path("config/apps.json")
 
+# Version lines under "Compatible versions:" in list-patches output
+VERSION_LINE_RE = re.compile(r'^\d+\.\d+\.\d+')
+NUMERIC_VERSION_RE = re.compile(r'\d+(?:\.\d+)*')
+ANY_VERSION_SET = frozenset({"any"})
+
+def version_sort_key(version):
+    """Sort key for purely numeric dotted versions"""
+    return tuple(map(int, version.split('.')))
+
 def get_patch_info():
-    """Get information about available patches using ReVanced CLI"""
+    """Get information about available patches using ReVanced CLI
+    
+    The CLI output is parsed line by line as it is produced, so the full
+    listing is never held in memory. Returns the package -> versions map,
+    or None on failure.
+    """
     try:
         # Find the CLI jar file
         cli_jar = None
@@ -45,21 +60,30 @@ def get_patch_info():
         ]
         
         print(f"🚀 Running: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=REVANCED_DIR.parent)
+        # stderr goes to a temp file so a chatty JVM can't block the stdout pipe
+        with tempfile.TemporaryFile(mode='w+') as stderr_file:
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+                                  text=True, bufsize=1, cwd=REVANCED_DIR.parent) as proc:
+                package_versions = parse_patch_output(proc.stdout)
+                returncode = proc.wait()
+            
+            if returncode != 0:
+                stderr_file.seek(0)
+                print(f"❌ CLI command failed with return code {returncode}")
+                print(f"Error output: {stderr_file.read()}")
+                return None
         
-        if result.returncode != 0:
-            print(f"❌ CLI command failed with return code {result.returncode}")
-            print(f"Error output: {result.stderr}")
-            return None
-        
-        return result.stdout
+        return package_versions
         
     except Exception as e:
         print(f"❌ Error getting patch info: {e}")
         return None
 
 def parse_patch_output(cli_output):
-    """Parse ReVanced CLI output to extract patch information"""
+    """Parse ReVanced CLI output to extract patch information
+    
+    Accepts the output as a string or any iterable of lines (e.g. a pipe).
+    """
     # Extract package-version mappings and detect packages that support "any" version
     package_versions = {}
     packages_with_patches = set()  # Track all packages that have patches
@@ -67,7 +91,7 @@ def parse_patch_output(cli_output):
     if not cli_output:
         return package_versions
     
-    lines = cli_output.split('\n')
+    lines = cli_output.split('\n') if isinstance(cli_output, str) else cli_output
     current_package = None
     looking_for_versions = False
     
@@ -76,9 +100,12 @@ def parse_patch_output(cli_output):
         if not line:
             continue
         
+        # Split off the "Key:" prefix once instead of probing each prefix in turn
+        key, _, value = line.partition(':')
+        
         # Look for package names
-        if line.startswith('Package name:'):
-            package_name = line.replace('Package name:', '').strip()
+        if key == 'Package name':
+            package_name = value.strip()
             current_package = package_name
             packages_with_patches.add(package_name)  # This package has patches
             if current_package not in package_versions:
@@ -87,15 +114,14 @@ def parse_patch_output(cli_output):
             continue
         
         # Look for version numbers under "Compatible versions:"
-        elif line.startswith('Compatible versions:'):
+        elif key == 'Compatible versions':
             looking_for_versions = True
             continue  # Just a header, versions come next
-        elif current_package and looking_for_versions and re.match(r'^\d+\.\d+\.\d+', line):
-            # This is a version number
-            version = line.strip()
-            package_versions[current_package].add(version)
+        elif current_package and looking_for_versions and line[0].isdigit() and VERSION_LINE_RE.match(line):
+            # This is a version number (already stripped)
+            package_versions[current_package].add(line)
             continue
-        elif current_package and line.startswith('Index:'):
+        elif current_package and key == 'Index':
             # New patch entry - stop looking for versions for current package
             looking_for_versions = False
             # If we found a package but no versions, it means "any version" is supported
@@ -108,15 +134,16 @@ def parse_patch_output(cli_output):
         package_versions[current_package].add("any")  # Special marker for "any version"
     
     # Convert sets to sorted lists (latest first), except for "any" version packages
-    for package in package_versions:
-        if package_versions[package] == {"any"} or package_versions[package] == ["any"]:
+    for package, version_set in package_versions.items():
+        if version_set == ANY_VERSION_SET:
             package_versions[package] = ["any"]  # Keep "any" as is
         else:
-            versions = list(package_versions[package])
-            # Sort versions properly (latest first)
-            try:
-                versions.sort(key=lambda x: [int(i) for i in x.split('.')], reverse=True)
-            except:
+            versions = list(version_set)
+            # Sort versions properly (latest first); fall back to plain string
+            # order when any version has a non-numeric part (e.g. "-beta")
+            if all(NUMERIC_VERSION_RE.fullmatch(v) for v in versions):
+                versions.sort(key=version_sort_key, reverse=True)
+            else:
                 versions.sort(reverse=True)
             package_versions[package] = versions
     
@@ -129,20 +156,16 @@ def get_supported_versions_for_package(package_name, package_versions):
 def analyze_config_apps():
     """Analyze the apps in config against available patches"""
     # Load config
-    with open(CONFIG_FILE, 'r') as f:
-        config = json.load(f)
+    config = read_json_file(CONFIG_FILE)
     
     # Get patch information
     print("🔍 Getting ReVanced patch information...")
-    cli_output = get_patch_info()
+    package_versions = get_patch_info()
     
-    if not cli_output:
+    if not package_versions:
         print("❌ Could not get patch information")
         return None
     
-    # Parse patches
-    package_versions = parse_patch_output(cli_output)
-    
     print(f"📦 Found patches for {len(package_versions)} packages")
     
     # Analyze each app in config
@@ -204,8 +227,7 @@ def main():
         # Save analysis results
         output_file = Path("downloads/patch_analysis.json")
         output_file.parent.mkdir(parents=True, exist_ok=True)  # Create directory if it doesn't exist
-        with open(output_file, 'w') as f:
-            json.dump(analysis, f, indent=2)
+        write_json_file(output_file, analysis, indent=False)  # machine-read by the next stage
         
         print(f"\n💾 Analysis saved to: {output_file}")
         
@@ -5,39 +5,103 @@ Patch APKs using ReVanced CLI
 
 import os
 import json
+import functools
+import random
+import re
+import shlex
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+from pipeline_logger import read_json_file, write_json_file
 
 REVANCED_DIR = Path("revanced")
 DOWNLOADS_DIR = Path("downloads")
 OUTPUT_DIR = Path("output")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Default JVM flags: only the class data sharing archive, which speeds up
+# startup without affecting the long, CPU-heavy patch run itself. Extra
+# flags (e.g. -XX:TieredStopAtLevel=1 or -XX:+UseSerialGC) can be opted
+# into through REVANCED_JAVA_OPTS, which is appended after these.
+JVM_FLAGS = ('-Xshare:auto',)
+
+# Architecture tokens in APK filenames, longest spellings first so e.g.
+# "x86_64" is not read as "x86". Values are (priority, architecture).
+ARCH_FILENAME_RE = re.compile(r'armeabi-v7a|armv7|arm64-v8a|arm64|aarch64|x86_64|x86|universal|noarch')
+ARCH_FILENAME_TOKENS = {
+    'armeabi-v7a': (0, 'armeabi-v7a'),
+    'armv7': (0, 'armeabi-v7a'),
+    'arm64-v8a': (1, 'arm64-v8a'),
+    'arm64': (1, 'arm64-v8a'),
+    'aarch64': (1, 'arm64-v8a'),
+    'x86_64': (2, 'x86_64'),
+    'x86': (3, 'x86'),
+    'universal': (4, 'universal'),
+    'noarch': (4, 'universal'),
+}
+
+def get_java_command():
+    """Java executable plus JVM flags for running the ReVanced CLI"""
+    return ['java', *JVM_FLAGS, *shlex.split(os.environ.get('REVANCED_JAVA_OPTS', ''))]
+
+def build_base_command(revanced_files):
+    """CLI command prefix shared by every APK of a run"""
+    return (
+        *get_java_command(), '-jar', os.fspath(revanced_files['cli']),
+        'patch',
+        '-p', os.fspath(revanced_files['patches'])
+    )
+
+@functools.lru_cache(maxsize=64)
+def _patch_flags(patches, exclude_patches):
+    """--enable/--disable arguments for an app's patch lists"""
+    flags = []
+    
+    # Add specific patches if configured
+    for patch in patches:
+        flags.extend(['--enable', patch])
+    
+    # Add excluded patches if configured
+    for patch in exclude_patches:
+        flags.extend(['--disable', patch])
+    
+    return tuple(flags)
+
+@functools.lru_cache(maxsize=1)
 def find_revanced_files():
-    """Find ReVanced CLI, patches, and integrations files"""
+    """
+    Find ReVanced CLI, patches, and integrations files
+    
+    The revanced/ directory doesn't change during a run, so the scan is
+    cached; a missing file raises and is not cached.
+    """
     files = {
         'cli': None,
         'patches': None,
         'integrations': None
     }
     
-    for file in REVANCED_DIR.glob("*.jar"):
-        name_lower = file.name.lower()
-        if 'cli' in name_lower:
-            files['cli'] = file
-    
-    # Look for patches file (.rvp extension)
-    for file in REVANCED_DIR.glob("*.rvp"):
-        name_lower = file.name.lower()
-        if 'patches' in name_lower:
-            files['patches'] = file
-    
-    for file in REVANCED_DIR.glob("*.apk"):
-        name_lower = file.name.lower()
-        if 'integrations' in name_lower:
-            files['integrations'] = file
+    # Single directory listing; file type is judged by name alone (no stat calls)
+    if REVANCED_DIR.is_dir():
+        with os.scandir(REVANCED_DIR) as entries:
+            for entry in entries:
+                name_lower = entry.name.lower()
+                if name_lower.endswith('.jar') and 'cli' in name_lower:
+                    files['cli'] = Path(entry.path)
+                elif name_lower.endswith('.rvp') and 'patches' in name_lower:
+                    # Patches file (.rvp extension)
+                    files['patches'] = Path(entry.path)
+                elif name_lower.endswith('.apk') and 'integrations' in name_lower:
+                    files['integrations'] = Path(entry.path)
+                else:
+                    continue
+                if all(files.values()):
+                    break
     
     # Verify all files found
     missing = [k for k, v in files.items() if v is None]
@@ -46,136 +110,222 @@ def find_revanced_files():
     
     return files
 
+def _invalidate_revanced_cache():
+    """Forget the cached find_revanced_files() result"""
+    find_revanced_files.cache_clear()
+
+@functools.lru_cache(maxsize=256)
 def _extract_architecture_from_filename(filename):
     """Extract architecture from APK filename"""
-    filename_lower = filename.lower()
-    
-    # Common architecture patterns in APK filenames
-    if 'armeabi-v7a' in filename_lower or 'armv7' in filename_lower:
-        return 'armeabi-v7a'
-    elif 'arm64-v8a' in filename_lower or 'arm64' in filename_lower or 'aarch64' in filename_lower:
-        return 'arm64-v8a'
-    elif 'x86_64' in filename_lower:
-        return 'x86_64'
-    elif 'x86' in filename_lower:
-        return 'x86'
-    elif 'universal' in filename_lower or 'noarch' in filename_lower:
-        return 'universal'
-    else:
-        # Fallback: try to extract from version pattern like "v1.0-universal"
-        import re
-        match = re.search(r'-(armeabi-v7a|arm64-v8a|x86_64|x86|universal|noarch)', filename_lower)
-        if match:
-            arch = match.group(1)
-            return 'armeabi-v7a' if arch in ['armv7', 'armeabi'] else arch
+    # One regex pass finds every architecture token; the highest-priority one wins
+    matches = ARCH_FILENAME_RE.findall(filename.lower())
+    if not matches:
         return 'universal'  # Default fallback
+    return min(ARCH_FILENAME_TOKENS[token] for token in matches)[1]
 
-def patch_apk(apk_path, app_info, revanced_files, max_retries=3):
+def _patched_output_path(apk_path):
+    """Output path for a patched APK, based on the input APK name"""
+    # Swap only the trailing .apk for -patched.apk, keeping the rest of the name
+    return OUTPUT_DIR / f"{apk_path.stem}-patched.apk"
+
+def _patch_stamp(app_info, revanced_files):
+    """Patch options an output APK was built with, stored next to it"""
+    return {
+        'cli': revanced_files['cli'].name,
+        'patches_file': revanced_files['patches'].name,
+        'patches': app_info.get('patches') or [],
+        'exclude_patches': app_info.get('exclude_patches') or [],
+    }
+
+def is_patch_up_to_date(apk_path, app_info, revanced_files):
+    """
+    Check if a previous run already patched this APK with the same tools
+    
+    The output must be newer than the input APK, CLI and patches file, and
+    its .stamp sidecar must match the configured patch options.
+    """
+    output_path = _patched_output_path(apk_path)
+    stamp_path = output_path.with_suffix('.stamp')
+    try:
+        output_mtime = output_path.stat().st_mtime
+        newest_input = max(
+            apk_path.stat().st_mtime,
+            revanced_files['cli'].stat().st_mtime,
+            revanced_files['patches'].stat().st_mtime
+        )
+        if output_mtime <= newest_input:
+            return False
+        with open(stamp_path, 'r') as f:
+            return json.load(f) == _patch_stamp(app_info, revanced_files)
+    except (OSError, ValueError):
+        return False
+
+def run_cli(cmd, stdout, timeout=600):
+    """
+    Run the CLI with stdout going to an open file; returns (returncode, stderr)
+    
+    stderr is spooled to a temp file rather than a pipe, so nothing has to
+    drain it while we wait. On timeout the process is killed and reaped
+    before TimeoutExpired is re-raised.
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=stdout, stderr=stderr_file, close_fds=True)
+        try:
+            returncode = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        stderr_file.seek(0)
+        return returncode, stderr_file.read().decode('utf-8', errors='replace')
+
+def list_existing_files(paths):
+    """Existing files among paths, from one directory listing per parent"""
+    existing = set()
+    for parent in {path.parent for path in paths}:
+        try:
+            with os.scandir(parent) as entries:
+                existing.update(Path(entry.path) for entry in entries if entry.is_file())
+        except OSError:
+            pass  # Missing directory - none of its paths exist
+    return existing
+
+def read_log_range(log_file, start, end):
+    """Read back part of a log file (e.g. the CLI's stdout for one attempt)"""
+    with open(log_file, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode('utf-8', errors='replace')
+
+class BufferedConsole:
+    """Collects a worker's console lines and prints them as one block"""
+    
+    lock = threading.Lock()
+    
+    def __init__(self):
+        self.lines = []
+    
+    def __call__(self, *args, **kwargs):
+        self.lines.append(' '.join(str(arg) for arg in args))
+    
+    def flush(self):
+        with self.lock:
+            print('\n'.join(self.lines), flush=True)
+        self.lines = []
+
+def patch_apk_buffered(*args, **kwargs):
+    """Run patch_apk with its output held back until the APK is done"""
+    console = BufferedConsole()
+    try:
+        return patch_apk(*args, emit=console, **kwargs)
+    finally:
+        console.flush()
+
+def retry_delay(attempt, backoff_base=2, backoff_cap=30):
+    """Exponential backoff with jitter, so parallel retries don't line up"""
+    return min(backoff_cap, backoff_base * 2 ** attempt + random.random())
+
+def patch_apk(apk_path, app_info, revanced_files, max_retries=3, emit=print, base_cmd=None,
+              backoff_base=2, backoff_cap=30):
     """
     Patch a single APK using ReVanced CLI with retry logic
+    
+    Console output goes through emit, so parallel runs can buffer it per APK.
+    base_cmd is the prefix from build_base_command(), built once per run.
     """
     app_name = app_info['name']
     package_name = app_info['package_name']
     
-    print(f"\n{'='*60}")
-    print(f"Patching: {app_name}")
-    print(f"Package: {package_name}")
-    print(f"{'='*60}")
+    emit(f"\n{'='*60}")
+    emit(f"Patching: {app_name}")
+    emit(f"Package: {package_name}")
+    emit(f"{'='*60}")
     
     # Create unique output filename based on input APK name
-    input_filename = apk_path.name
-    # Replace .apk with -patched.apk but keep the rest of the original filename
-    output_filename = input_filename.replace('.apk', '-patched.apk')
-    output_path = OUTPUT_DIR / output_filename
+    output_path = _patched_output_path(apk_path)
+    stamp_path = output_path.with_suffix('.stamp')
     
-    # Build ReVanced command
+    # Build ReVanced command from the shared prefix
+    if base_cmd is None:
+        base_cmd = build_base_command(revanced_files)
     cmd = [
-        'java', '-jar', str(revanced_files['cli']),
-        'patch',
-        '-p', str(revanced_files['patches']),
-        '-o', str(output_path),
-        str(apk_path)
+        *base_cmd,
+        '-o', os.fspath(output_path),
+        os.fspath(apk_path),
+        *_patch_flags(tuple(app_info.get('patches') or ()), tuple(app_info.get('exclude_patches') or ()))
     ]
+    cmd_str = shlex.join(cmd)  # once per APK, shell-quoted so it can be re-run as-is
     
-    # Add specific patches if configured
-    if app_info.get('patches'):
-        for patch in app_info['patches']:
-            cmd.extend(['--enable', patch])
-    
-    # Add excluded patches if configured
-    if app_info.get('exclude_patches'):
-        for patch in app_info['exclude_patches']:
-            cmd.extend(['--disable', patch])
-    
-    print(f"Command: {' '.join(cmd)}\n")
+    emit(f"Command: {cmd_str}\n")
     
     # Retry logic for patching
     last_error = None
-    log_file = OUTPUT_DIR / f"{package_name}-patch.log"
+    log_file = OUTPUT_DIR / f"{apk_path.stem}-patch.log"  # per APK, safe when patching in parallel
     
     for attempt in range(max_retries):
         try:
-            print(f"📱 Patching attempt {attempt + 1}/{max_retries}...")
+            emit(f"📱 Patching attempt {attempt + 1}/{max_retries}...")
             
             # Clean up previous output file if it exists
             if output_path.exists():
                 output_path.unlink()
+            if stamp_path.exists():
+                stamp_path.unlink()
             
-            # Run the patching process
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600  # 10 minute timeout
-            )
-            
-            # Log output (append for multiple attempts)
+            # Log output (append for multiple attempts). The CLI's stdout goes
+            # straight into the log file; stderr is read back after the run.
             log_mode = 'w' if attempt == 0 else 'a'
             with open(log_file, log_mode) as f:
+                header = [f"Command: {cmd_str}\n\n", "STDOUT:\n"]
                 if attempt > 0:
-                    f.write(f"\n\n{'='*50}\nRETRY ATTEMPT {attempt + 1}/{max_retries}\n{'='*50}\n")
-                f.write(f"Command: {' '.join(cmd)}\n\n")
-                f.write("STDOUT:\n")
-                f.write(result.stdout)
-                f.write("\n\nSTDERR:\n")
-                f.write(result.stderr)
-                f.write(f"\n\nReturn code: {result.returncode}")
+                    header.insert(0, f"\n\n{'='*50}\nRETRY ATTEMPT {attempt + 1}/{max_retries}\n{'='*50}\n")
+                f.writelines(header)
+                f.flush()
+                stdout_start = f.tell()
+                
+                # Run the patching process
+                returncode, stderr = run_cli(cmd, stdout=f, timeout=600)  # 10 minute timeout
+                
+                # The child wrote through the shared descriptor - resync to its end
+                stdout_end = f.seek(0, os.SEEK_END)
+                f.writelines(["\n\nSTDERR:\n", stderr, f"\n\nReturn code: {returncode}"])
             
-            if result.returncode == 0 and output_path.exists():
-                print(f"✓ Successfully patched {app_name} (attempt {attempt + 1})")
+            if returncode == 0 and output_path.exists():
+                emit(f"✓ Successfully patched {app_name} (attempt {attempt + 1})")
+                with open(stamp_path, 'w') as f:
+                    json.dump(_patch_stamp(app_info, revanced_files), f)
                 return {
                     'success': True,
                     'app': app_info,
-                    'input_apk': str(apk_path),
-                    'output_apk': str(output_path),
-                    'log_file': str(log_file),
+                    'input_apk': os.fspath(apk_path),
+                    'output_apk': os.fspath(output_path),
+                    'log_file': os.fspath(log_file),
                     'attempts': attempt + 1
                 }
             else:
-                error_msg = result.stderr or result.stdout
+                error_msg = stderr or read_log_range(log_file, stdout_start, stdout_end)
                 last_error = {
                     'error': error_msg,
-                    'return_code': result.returncode,
+                    'return_code': returncode,
                     'attempt': attempt + 1
                 }
                 
                 if attempt < max_retries - 1:
-                    print(f"✗ Patching failed (attempt {attempt + 1}), retrying...")
-                    print(f"  Return code: {result.returncode}")
-                    if result.stderr:
-                        print(f"  Error: {result.stderr[:200]}")
-                    print(f"🔄 Waiting 3 seconds before retry...")
-                    import time
-                    time.sleep(3)
+                    emit(f"✗ Patching failed (attempt {attempt + 1}), retrying...")
+                    emit(f"  Return code: {returncode}")
+                    if stderr:
+                        emit(f"  Error: {stderr[:200]}")
+                    delay = retry_delay(attempt, backoff_base, backoff_cap)
+                    emit(f"🔄 Waiting {delay:.1f} seconds before retry...")
+                    time.sleep(delay)
                 else:
-                    print(f"✗ Failed to patch {app_name} after {max_retries} attempts")
-                    print(f"  Final return code: {result.returncode}")
-                    if result.stderr:
-                        print(f"  Final error: {result.stderr[:200]}")
+                    emit(f"✗ Failed to patch {app_name} after {max_retries} attempts")
+                    emit(f"  Final return code: {returncode}")
+                    if stderr:
+                        emit(f"  Final error: {stderr[:200]}")
                 
         except subprocess.TimeoutExpired:
             error_msg = f"Patching timed out after 10 minutes (attempt {attempt + 1})"
-            print(f"✗ {error_msg}")
+            emit(f"✗ {error_msg}")
             last_error = {
                 'error': error_msg,
                 'return_code': -1,
@@ -183,13 +333,12 @@ def patch_apk(apk_path, app_info, revanced_files, max_retries=3):
             }
             
             if attempt < max_retries - 1:
-                print(f"🔄 Retrying after timeout...")
-                import time
-                time.sleep(3)
+                emit(f"🔄 Retrying after timeout...")
+                time.sleep(retry_delay(attempt, backoff_base, backoff_cap))
             
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)} (attempt {attempt + 1})"
-            print(f"✗ {error_msg}")
+            emit(f"✗ {error_msg}")
             last_error = {
                 'error': error_msg,
                 'return_code': -1,
@@ -197,18 +346,17 @@ def patch_apk(apk_path, app_info, revanced_files, max_retries=3):
             }
             
             if attempt < max_retries - 1:
-                print(f"🔄 Retrying after error...")
-                import time
-                time.sleep(3)
+                emit(f"🔄 Retrying after error...")
+                time.sleep(retry_delay(attempt, backoff_base, backoff_cap))
     
     # All attempts failed
     return {
         'success': False,
         'app': app_info,
-        'input_apk': str(apk_path),
+        'input_apk': os.fspath(apk_path),
         'error': last_error['error'],
         'return_code': last_error['return_code'],
-        'log_file': str(log_file),
+        'log_file': os.fspath(log_file),
         'attempts': max_retries
     }
 
@@ -230,8 +378,7 @@ def main():
             return 1  # Critical error - missing prerequisite
         
         try:
-            with open(download_results_file, 'r') as f:
-                download_results = json.load(f)
+            download_results = read_json_file(download_results_file)
         except Exception as e:
             print(f"❌ Critical Error: Failed to load download results: {e}")
             return 1  # Critical error - file corruption
@@ -253,12 +400,19 @@ def main():
         # Load configuration for retry settings
         config_file = Path("config/apps.json")
         max_patch_retries = 3  # Default
+        max_parallel_patches = 1
+        backoff = {}
         if config_file.exists():
             try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    max_patch_retries = config.get('settings', {}).get('max_patch_retries', 3)
-                    print(f"📋 Patch retry limit: {max_patch_retries}")
+                settings = read_json_file(config_file).get('settings', {})
+                max_patch_retries = settings.get('max_patch_retries', 3)
+                max_parallel_patches = settings.get('max_parallel_patches', 1)
+                backoff = {
+                    'backoff_base': settings.get('patch_backoff_base', 2),
+                    'backoff_cap': settings.get('patch_backoff_cap', 30)
+                }
+                print(f"📋 Patch retry limit: {max_patch_retries}")
+                print(f"📋 Parallel patch jobs: {max_parallel_patches}")
             except Exception as e:
                 print(f"⚠️  Could not load config, using default retry limit: {e}")
         
@@ -266,35 +420,70 @@ def main():
         results = {
             'successful': [],
             'failed': [],
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now(timezone.utc).isoformat()
         }
         
+        # The java/CLI/patches part of the command is the same for every APK
+        base_cmd = build_base_command(revanced_files)
+        
+        # Flatten to one task per APK (multiple APKs possible per app). The
+        # same APK listed twice for a package would only be patched again
+        # into the same output, so duplicates are dropped.
+        tasks = []
+        seen_tasks = set()
         for item in download_results['successful']:
-            app_info = item['app']
-            apk_paths = item['paths']  # Multiple APKs possible
-            
-            for apk_path_str in apk_paths:
-                apk_path = Path(apk_path_str)
-                
-                if not apk_path.exists():
+            for apk_path_str in item['paths']:
+                task_key = (os.path.normpath(apk_path_str), item['app']['package_name'])
+                if task_key in seen_tasks:
+                    print(f"⏭️  Duplicate APK entry, skipping: {apk_path_str}")
+                    continue
+                seen_tasks.add(task_key)
+                tasks.append((Path(apk_path_str), item['app']))
+        
+        # Each APK is an independent CLI run, so several can patch at once.
+        # Outcomes are collected in task order to keep the results stable.
+        outcomes = []
+        existing_apks = list_existing_files(apk_path for apk_path, _ in tasks)
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel_patches)) as executor:
+            for apk_path, app_info in tasks:
+                if apk_path not in existing_apks:
                     print(f"✗ APK not found: {apk_path}")
-                    results['failed'].append({
+                    outcomes.append({
                         'app': app_info,
                         'error': 'APK file not found'
                     })
                     continue
                 
-                result = patch_apk(apk_path, app_info, revanced_files, max_patch_retries)
+                # Same input, tools and patch options as last run - reuse the output
+                if is_patch_up_to_date(apk_path, app_info, revanced_files):
+                    print(f"⏭️  Up to date, skipping: {apk_path.name}")
+                    outcomes.append({
+                        'success': True,
+                        'skipped': True,
+                        'app': app_info,
+                        'input_apk': os.fspath(apk_path),
+                        'output_apk': os.fspath(_patched_output_path(apk_path)),
+                        'log_file': os.fspath(OUTPUT_DIR / f"{apk_path.stem}-patch.log"),
+                        'attempts': 0
+                    })
+                    continue
+                
+                if max_parallel_patches > 1:
+                    outcomes.append(executor.submit(patch_apk_buffered, apk_path, app_info, revanced_files, max_patch_retries, base_cmd=base_cmd, **backoff))
+                else:
+                    outcomes.append(patch_apk(apk_path, app_info, revanced_files, max_patch_retries, base_cmd=base_cmd, **backoff))
+            
+            for outcome in outcomes:
+                result = outcome if isinstance(outcome, dict) else outcome.result()
                 
-                if result['success']:
+                if result.get('success'):
                     results['successful'].append(result)
                 else:
                     results['failed'].append(result)
         
         # Save results for next steps
         results_file = OUTPUT_DIR / "patch_results.json"
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        write_json_file(results_file, results, indent=False)  # machine-read only
         
         # Print summary
         print(f"\n{'='*60}")
@@ -326,8 +515,10 @@ def main():
         # Set GitHub Actions output
         if 'GITHUB_OUTPUT' in os.environ:
             with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
-                f.write(f"success_count={len(results['successful'])}\n")
-                f.write(f"failure_count={len(results['failed'])}\n")
+                f.write(
+                    f"success_count={len(results['successful'])}\n"
+                    f"failure_count={len(results['failed'])}\n"
+                )
     
         # Return appropriate exit codes
         if len(results['successful']) == 0 and len(results['failed']) > 0:
@@ -347,6 +538,5 @@ def main():
         return 1  # Critical script error
 
 if __name__ == "__main__":
-    import sys
     exit_code = main()
     sys.exit(exit_code)
\ No newline at end of file
@@ -5,32 +5,162 @@ Pipeline status logger for tracking releases and patches
 
 import os
 import json
+import mmap
+import re
 import sys
+from collections import defaultdict
+from dataclasses import dataclass, asdict, is_dataclass
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 LOGS_DIR = Path("logs")
-PIPELINE_LOG = LOGS_DIR / "pipeline_history.json"
-RELEASES_LOG = LOGS_DIR / "release_history.json"
+# Histories are append-only JSON Lines files: one record per line
+PIPELINE_LOG = LOGS_DIR / "pipeline_history.jsonl"
+RELEASES_LOG = LOGS_DIR / "release_history.jsonl"
+PIPELINE_HISTORY_LIMIT = 50
+RELEASE_HISTORY_LIMIT = 30
+# Below this size a plain read is cheaper than setting up a mapping
+MMAP_MIN_SIZE = 64 * 1024
+
+# GitHub Actions run metadata, read once - the environment doesn't change mid-run
+_RUN_ID = os.environ.get('GITHUB_RUN_ID', 'local')
+_RUN_NUMBER = os.environ.get('GITHUB_RUN_NUMBER', '0')
+_WORKFLOW = os.environ.get('GITHUB_WORKFLOW', 'Manual')
+_COMMIT_SHA = os.environ.get('GITHUB_SHA', 'unknown')
+_ACTOR = os.environ.get('GITHUB_ACTOR', 'local')
+
+# Architecture segment of a patched APK filename; anything else is universal
+ARCH_FILENAME_RE = re.compile(r'-(armeabi-v7a|arm64-v8a|x86_64)-')
+
+@dataclass(slots=True)
+class AppReleased:
+    """One APK entry of a release record"""
+    name: str
+    package: str
+    architecture: str
+    size_mb: float
+    filename: str
 
 def ensure_logs_dir():
     """Ensure logs directory exists"""
     LOGS_DIR.mkdir(exist_ok=True)
 
+def read_json_file(path: Path):
+    """Read a JSON file, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_json_file(path: Path, data, indent: bool = True):
+    """Write data as JSON, using orjson when available
+    
+    Writes to a temp file and swaps it into place, so readers never see a
+    partially written file.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=option))
+    else:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2 if indent else None)
+    os.replace(tmp_path, path)
+
+def _json_default(obj):
+    """Serialize dataclass records for the stdlib json fallback"""
+    if is_dataclass(obj):
+        return asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _dump_line(entry) -> bytes:
+    """Serialize one history record as a JSON line"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(entry) + b'\n'  # orjson serializes dataclasses natively
+    return json.dumps(entry, default=_json_default).encode('utf-8') + b'\n'
+
+def _read_history_lines(path: Path, limit: int) -> list:
+    """Raw record lines of a JSON Lines history file, newest `limit` only
+    
+    Large files are memory-mapped and scanned backwards from the end, so
+    only the kept tail is copied out of the page cache.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return [line for line in f.read().splitlines() if line.strip()][-limit:]
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = []
+            end = len(mm)
+            while end > 0 and len(lines) < limit:
+                start = mm.rfind(b'\n', 0, end) + 1
+                line = mm[start:end]
+                if line.strip():
+                    lines.append(line)
+                end = start - 1
+            lines.reverse()
+            return lines
+
+def _loads(line: bytes):
+    """Parse one JSON line"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(line)
+    return json.loads(line)
+
+def load_history(path: Path, limit: int) -> list:
+    """Load the newest `limit` records of a history file
+    
+    Falls back to the old single-array .json file if no .jsonl exists yet.
+    """
+    if path.exists():
+        return [_loads(line) for line in _read_history_lines(path, limit)]
+    legacy_path = path.with_suffix('.json')
+    if legacy_path.exists():
+        return read_json_file(legacy_path)[-limit:]
+    return []
+
 def load_pipeline_history() -> list:
     """Load pipeline history"""
-    if PIPELINE_LOG.exists():
-        with open(PIPELINE_LOG, 'r') as f:
-            return json.load(f)
-    return []
+    return load_history(PIPELINE_LOG, PIPELINE_HISTORY_LIMIT)
 
 def load_release_history() -> list:
     """Load release history"""
-    if RELEASES_LOG.exists():
-        with open(RELEASES_LOG, 'r') as f:
-            return json.load(f)
-    return []
+    return load_history(RELEASES_LOG, RELEASE_HISTORY_LIMIT)
+
+def append_history(path: Path, entry: Dict, limit: int):
+    """Append an entry to a history file, keeping roughly the newest `limit` entries
+    
+    A run only appends its own record. Once the file holds more than twice
+    `limit` records it is compacted back to the newest `limit`, so the
+    rewrite cost is spread over many runs.
+    """
+    if not path.exists():
+        # First write - carry over records from the old .json format
+        history = load_history(path, limit)
+        if history:
+            with open(path, 'wb') as f:
+                f.writelines(_dump_line(record) for record in history)
+    
+    with open(path, 'ab') as f:
+        f.write(_dump_line(entry))
+    
+    # Reading one past the threshold is enough to know if it was crossed
+    lines = _read_history_lines(path, 2 * limit + 1)
+    if len(lines) > 2 * limit:
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.writelines(line + b'\n' for line in lines[-limit:])
+        os.replace(tmp_path, path)
 
 def log_pipeline_run(
     trigger: str,
@@ -45,13 +175,13 @@ def log_pipeline_run(
     
     # Get pipeline metadata
     pipeline_data = {
-        "timestamp": datetime.now().isoformat(),
-        "run_id": os.environ.get('GITHUB_RUN_ID', 'local'),
-        "run_number": os.environ.get('GITHUB_RUN_NUMBER', '0'),
-        "workflow": os.environ.get('GITHUB_WORKFLOW', 'Manual'),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "run_id": _RUN_ID,
+        "run_number": _RUN_NUMBER,
+        "workflow": _WORKFLOW,
         "trigger": trigger,  # 'schedule', 'manual', 'config_change'
-        "commit_sha": os.environ.get('GITHUB_SHA', 'unknown'),
-        "actor": os.environ.get('GITHUB_ACTOR', 'local'),
+        "commit_sha": _COMMIT_SHA,
+        "actor": _ACTOR,
         "status": status,  # 'success', 'partial', 'failed'
         "results": {
             "downloads": download_results,
@@ -63,27 +193,20 @@ def log_pipeline_run(
     
     # Add summary statistics
     if download_results and patch_results:
+        downloads_successful = len(download_results.get('successful', []))
+        downloads_failed = len(download_results.get('failed', []))
         pipeline_data["summary"] = {
-            "apps_attempted": len(download_results.get('successful', [])) + len(download_results.get('failed', [])),
-            "downloads_successful": len(download_results.get('successful', [])),
-            "downloads_failed": len(download_results.get('failed', [])),
+            "apps_attempted": downloads_successful + downloads_failed,
+            "downloads_successful": downloads_successful,
+            "downloads_failed": downloads_failed,
             "patches_successful": len(patch_results.get('successful', [])),
             "patches_failed": len(patch_results.get('failed', [])),
             "release_created": bool(release_info),
             "issues_created": len(issues_created.get('created', [])) if issues_created else 0
         }
     
-    # Load existing history and append
-    history = load_pipeline_history()
-    history.append(pipeline_data)
-    
-    # Keep only last 50 runs to prevent file getting too large
-    if len(history) > 50:
-        history = history[-50:]
-    
-    # Save updated history
-    with open(PIPELINE_LOG, 'w') as f:
-        json.dump(history, f, indent=2)
+    # Append to history, keeping only last 50 runs to prevent file getting too large
+    append_history(PIPELINE_LOG, pipeline_data, PIPELINE_HISTORY_LIMIT)
     
     print(f"✓ Pipeline run logged: {pipeline_data['timestamp']}")
     return pipeline_data
@@ -93,60 +216,49 @@ def log_release_created(release_info: Dict, patch_results: Dict):
     ensure_logs_dir()
     
     release_data = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "tag": release_info.get('tag'),
         "url": release_info.get('url'),
-        "run_id": os.environ.get('GITHUB_RUN_ID', 'local'),
+        "run_id": _RUN_ID,
         "apps_released": [],
         "total_size_mb": 0,
         "architecture_variants": {}
     }
     
     # Analyze released apps
+    architecture_variants = defaultdict(list)
     for item in patch_results.get('successful', []):
         app_name = item['app']['name']
         apk_path = Path(item['output_apk'])
         
-        if apk_path.exists():
+        # One stat gives both existence and size
+        try:
             size_mb = apk_path.stat().st_size / (1024*1024)
-            
-            # Extract architecture from filename
-            arch = "universal"
-            if "-armeabi-v7a-" in apk_path.name:
-                arch = "armeabi-v7a"
-            elif "-arm64-v8a-" in apk_path.name:
-                arch = "arm64-v8a"
-            elif "-x86_64-" in apk_path.name:
-                arch = "x86_64"
-            
-            release_data["apps_released"].append({
-                "name": app_name,
-                "package": item['app']['package_name'],
-                "architecture": arch,
-                "size_mb": round(size_mb, 1),
-                "filename": apk_path.name
-            })
-            
-            release_data["total_size_mb"] += size_mb
-            
-            # Count architecture variants
-            if app_name not in release_data["architecture_variants"]:
-                release_data["architecture_variants"][app_name] = []
-            release_data["architecture_variants"][app_name].append(arch)
+        except OSError:
+            continue
+        
+        # Extract architecture from filename
+        arch_match = ARCH_FILENAME_RE.search(apk_path.name)
+        arch = arch_match.group(1) if arch_match else "universal"
+        
+        release_data["apps_released"].append(AppReleased(
+            name=app_name,
+            package=item['app']['package_name'],
+            architecture=arch,
+            size_mb=round(size_mb, 1),
+            filename=apk_path.name
+        ))
+        
+        release_data["total_size_mb"] += size_mb
+        
+        # Count architecture variants
+        architecture_variants[app_name].append(arch)
     
     release_data["total_size_mb"] = round(release_data["total_size_mb"], 1)
+    release_data["architecture_variants"] = dict(architecture_variants)
     
-    # Load existing release history and append
-    history = load_release_history()
-    history.append(release_data)
-    
-    # Keep only last 30 releases
-    if len(history) > 30:
-        history = history[-30:]
-    
-    # Save updated history
-    with open(RELEASES_LOG, 'w') as f:
-        json.dump(history, f, indent=2)
+    # Append to release history, keeping only last 30 releases
+    append_history(RELEASES_LOG, release_data, RELEASE_HISTORY_LIMIT)
     
     print(f"✓ Release logged: {release_data['tag']} ({release_data['total_size_mb']} MB)")
     return release_data
@@ -157,13 +269,13 @@ def log_pipeline_skip(trigger: str, reason: str, pending_info: Optional[Dict] =
     
     # Get pipeline metadata
     pipeline_data = {
-        "timestamp": datetime.now().isoformat(),
-        "run_id": os.environ.get('GITHUB_RUN_ID', 'local'),
-        "run_number": os.environ.get('GITHUB_RUN_NUMBER', '0'),
-        "workflow": os.environ.get('GITHUB_WORKFLOW', 'Manual'),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "run_id": _RUN_ID,
+        "run_number": _RUN_NUMBER,
+        "workflow": _WORKFLOW,
         "trigger": trigger,  # 'schedule', 'manual', 'config_change'
-        "commit_sha": os.environ.get('GITHUB_SHA', 'unknown'),
-        "actor": os.environ.get('GITHUB_ACTOR', 'local'),
+        "commit_sha": _COMMIT_SHA,
+        "actor": _ACTOR,
         "status": "skipped",
         "reason": reason,
         "results": {
@@ -171,17 +283,8 @@ def log_pipeline_skip(trigger: str, reason: str, pending_info: Optional[Dict] =
         }
     }
     
-    # Load existing history and append
-    history = load_pipeline_history()
-    history.append(pipeline_data)
-    
-    # Keep only last 50 runs to prevent file getting too large
-    if len(history) > 50:
-        history = history[-50:]
-    
-    # Save updated history
-    with open(PIPELINE_LOG, 'w') as f:
-        json.dump(history, f, indent=2)
+    # Append to history, keeping only last 50 runs to prevent file getting too large
+    append_history(PIPELINE_LOG, pipeline_data, PIPELINE_HISTORY_LIMIT)
     
     print(f"✓ Pipeline skip logged: {pipeline_data['timestamp']}")
     return pipeline_data
@@ -200,22 +303,29 @@ def get_pipeline_stats():
         }
     
     total = len(history)
-    successful = len([r for r in history if r.get('status') == 'success'])
+    recent_count = min(total, 10)  # Recent activity (last 10 runs)
+    successful = 0
+    recent_success = 0
+    last_successful_release = None
     
-    # Recent activity (last 10 runs)
-    recent = history[-10:] if len(history) >= 10 else history
-    recent_success = len([r for r in recent if r.get('status') == 'success'])
+    # One walk from newest to oldest covers all three figures
+    for i, run in enumerate(reversed(history)):
+        if run.get('status') == 'success':
+            successful += 1
+            if i < recent_count:
+                recent_success += 1
+        if last_successful_release is None:
+            results = run.get('results')  # no throwaway {} default per record
+            if results and results.get('release'):
+                last_successful_release = run['timestamp']
     
     return {
         "total_runs": total,
         "successful_runs": successful,
-        "success_rate": round((successful / total) * 100, 1) if total > 0 else 0,
-        "recent_success_rate": round((recent_success / len(recent)) * 100, 1) if recent else 0,
-        "last_run": history[-1]['timestamp'] if history else None,
-        "last_successful_release": next(
-            (r['timestamp'] for r in reversed(history) if r.get('results', {}).get('release')), 
-            None
-        )
+        "success_rate": round((successful / total) * 100, 1),
+        "recent_success_rate": round((recent_success / recent_count) * 100, 1),
+        "last_run": history[-1]['timestamp'],
+        "last_successful_release": last_successful_release
     }
 
 def print_pipeline_summary():
@@ -4,33 +4,36 @@ Pipeline orchestrator with comprehensive logging
 """
 
 import os
-import json
+import functools
 import sys
 from pathlib import Path
 from datetime import datetime
-from pipeline_logger import log_pipeline_run, print_pipeline_summary
+from pipeline_logger import log_pipeline_run, log_pipeline_skip as log_skip, print_pipeline_summary, read_json_file
+
+# GitHub event name -> pipeline trigger type
+TRIGGERS = {
+    'schedule': 'schedule',
+    'workflow_dispatch': 'manual',
+    'push': 'config_change',
+}
 
 def determine_trigger():
     """Determine what triggered the pipeline"""
-    if os.environ.get('GITHUB_EVENT_NAME') == 'schedule':
-        return 'schedule'
-    elif os.environ.get('GITHUB_EVENT_NAME') == 'workflow_dispatch':
-        return 'manual'
-    elif os.environ.get('GITHUB_EVENT_NAME') == 'push':
-        return 'config_change'
-    else:
-        return 'unknown'
+    return TRIGGERS.get(os.environ.get('GITHUB_EVENT_NAME'), 'unknown')
+
+@functools.lru_cache(maxsize=None)
+def _read_results(filepath: str, mtime_ns: int):
+    """Parse a results file; cached per path and modification time"""
+    return read_json_file(Path(filepath))
 
 def load_results_file(filepath: str):
     """Load results from JSON file if it exists"""
-    path = Path(filepath)
-    if path.exists():
-        try:
-            with open(path, 'r') as f:
-                return json.load(f)
-        except:
-            return None
-    return None
+    # The stat doubles as the existence check; unreadable or malformed
+    # files count as missing
+    try:
+        return _read_results(filepath, Path(filepath).stat().st_mtime_ns)
+    except (OSError, ValueError):
+        return None
 
 def log_pipeline_skip():
     """Log when pipeline is skipped due to no new versions"""
@@ -42,7 +45,6 @@ def log_pipeline_skip():
     pending_info = load_results_file("logs/pending_release.json")
     
     # Create skip log entry
-    from pipeline_logger import log_pipeline_skip as log_skip
     pipeline_data = log_skip(
         trigger=trigger,
         reason="No new versions to release",
@@ -63,7 +65,6 @@ def log_pipeline_skip():
 
 def log_pipeline_completion():
     """Log the completion of entire pipeline"""
-    """Log the completion of entire pipeline"""
     
     # Determine trigger
     trigger = determine_trigger()
@@ -3,14 +3,42 @@
 Check if there are new versions to release based on patch analysis and previous releases
 """
 
-import json
+import functools
+import re
 import sys
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import defaultdict
+from operator import itemgetter
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from pipeline_logger import read_json_file, write_json_file
 
 PATCH_ANALYSIS_FILE = Path("downloads/patch_analysis.json")
+PENDING_RELEASE_FILE = Path("logs/pending_release.json")
+
+# Package name and version in a release asset filename
+# (e.g., com.google.android.youtube-v20.14.43-universal-patched.apk)
+ASSET_PACKAGE_RE = re.compile(r'^([^-]+)')
+ASSET_VERSION_RE = re.compile(r'-v?(\d+\.\d+\.\d+(?:\.\d+)?)')
+
+def parse_asset_name(filename):
+    """(package, version) from a release asset filename, or None"""
+    # Current naming is {package}-v{version}-{variant}-patched.apk, which plain
+    # string splitting handles; anything else goes through the regexes
+    parts = filename.split('-', 2)
+    if len(parts) == 3 and parts[0] and parts[1][:1] == 'v':
+        numbers = parts[1][1:].split('.')
+        if 3 <= len(numbers) <= 4 and all(n.isdigit() for n in numbers):
+            return parts[0], parts[1][1:]
+    
+    package_match = ASSET_PACKAGE_RE.search(filename)
+    version_match = ASSET_VERSION_RE.search(filename)
+    if package_match and version_match:
+        return package_match.group(1), version_match.group(1)
+    return None
 
 def load_patch_analysis():
     """Load the current patch analysis"""
@@ -18,8 +46,21 @@ def load_patch_analysis():
         print("❌ Patch analysis file not found")
         return None
     
-    with open(PATCH_ANALYSIS_FILE, 'r') as f:
-        return json.load(f)
+    return read_json_file(PATCH_ANALYSIS_FILE)
+
+@functools.lru_cache(maxsize=1)
+def get_github_session():
+    """Keep-alive session for GitHub API calls, with backoff on transient errors"""
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET'],
+        respect_retry_after_header=True
+    )
+    session.mount('https://', HTTPAdapter(max_retries=retry))
+    return session
 
 def load_release_history_from_github():
     """Load the release history from GitHub API"""
@@ -29,13 +70,14 @@ def load_release_history_from_github():
         
         # Try to get GitHub token for higher rate limits, but work without it
         github_token = os.environ.get('GITHUB_TOKEN')
-        headers = {}
+        headers = {'Accept': 'application/vnd.github+json'}
         if github_token:
             headers['Authorization'] = f'token {github_token}'
         
-        # Fetch releases from GitHub API
-        url = f"https://api.github.com/repos/{repo_name}/releases"
-        response = requests.get(url, headers=headers)
+        # Fetch releases from GitHub API - only the newest one is ever compared
+        # against, and the list is ordered newest first
+        url = f"https://api.github.com/repos/{repo_name}/releases?per_page=1"
+        response = get_github_session().get(url, headers=headers, timeout=(5, 30))
         
         if response.status_code == 200:
             releases = response.json()
@@ -49,37 +91,36 @@ def load_release_history_from_github():
         print(f"⚠️  Error fetching release history from GitHub: {e}")
         return []
 
-def get_latest_released_versions():
-    """Get the latest released versions for each app from GitHub releases"""
-    releases = load_release_history_from_github()
+@functools.lru_cache(maxsize=256)
+def parse_timestamp(timestamp):
+    """Parse an ISO timestamp (GitHub's trailing 'Z' included) as an aware datetime"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+def get_latest_release(releases):
+    """Most recently published release, or None if there are none"""
     if not releases:
+        return None
+    return max(releases, key=itemgetter('published_at'))
+
+def get_latest_released_versions(latest_release=None):
+    """Get the latest released versions for each app from GitHub releases"""
+    if latest_release is None:
+        latest_release = get_latest_release(load_release_history_from_github())
+    if not latest_release:
         return {}
     
-    # Get the most recent release
-    latest_release = max(releases, key=lambda x: x['published_at'])
-    
     print(f"📋 Latest release: {latest_release['tag_name']} ({latest_release['published_at']})")
     
     # Extract app versions from the release assets
-    released_versions = {}
+    released_versions = defaultdict(set)
     for asset in latest_release.get('assets', []):
-        filename = asset['name']
-        
         # Extract package name and version from filename 
-        # (e.g., com.google.android.youtube-v20.14.43-universal-patched.apk)
-        import re
-        package_match = re.search(r'^([^-]+)', filename)
-        version_match = re.search(r'-v?(\d+\.\d+\.\d+(?:\.\d+)?)', filename)
-        
-        if package_match and version_match:
-            package = package_match.group(1)
-            version = version_match.group(1)
-            
-            if package not in released_versions:
-                released_versions[package] = set()
+        parsed = parse_asset_name(asset['name'])
+        if parsed:
+            package, version = parsed
             released_versions[package].add(version)
     
-    return released_versions
+    return dict(released_versions)
 
 def check_for_new_versions():
     """Check if there are new versions that need to be released"""
@@ -87,16 +128,23 @@ def check_for_new_versions():
     if not patch_analysis:
         return False, "No patch analysis available"
     
-    released_versions = get_latest_released_versions()
-    releases = load_release_history_from_github()
+    # Fetch releases once and pick the latest one for all checks below
+    latest_release = get_latest_release(load_release_history_from_github())
+    released_versions = get_latest_released_versions(latest_release) if latest_release else {}
     
     new_versions_found = []
     
-    # Get the timestamp of the latest release for time-based checks
+    # Age of the latest release for time-based checks (both sides UTC-aware)
     latest_release_time = None
-    if releases:
-        latest_release = max(releases, key=lambda x: x['published_at'])
-        latest_release_time = datetime.fromisoformat(latest_release['published_at'].replace('Z', '+00:00'))
+    days_since_release = None
+    apps_in_latest_release = set()
+    if latest_release:
+        latest_release_time = parse_timestamp(latest_release['published_at'])
+        days_since_release = (datetime.now(timezone.utc) - latest_release_time).days
+        for asset in latest_release.get('assets', []):
+            package_match = ASSET_PACKAGE_RE.search(asset['name'])
+            if package_match:
+                apps_in_latest_release.add(package_match.group(1))
     
     for package, app_info in patch_analysis.items():
         app_name = app_info['name']
@@ -109,18 +157,8 @@ def check_for_new_versions():
         if app_info.get('supports_any_version') or recommended_version in ['any', 'latest']:
             # For "any" version apps, check if we've released recently (within last 7 days)
             if latest_release_time:
-                # Make datetime timezone-aware for comparison
-                now = datetime.now(latest_release_time.tzinfo)
-                days_since_release = (now - latest_release_time).days
-                
                 # Check if this app was in the latest release
-                app_in_latest_release = False
-                if releases:
-                    latest_release = max(releases, key=lambda x: x['published_at'])
-                    for asset in latest_release.get('assets', []):
-                        if package in asset['name']:
-                            app_in_latest_release = True
-                            break
+                app_in_latest_release = package in apps_in_latest_release
                 
                 # If app wasn't in latest release or it's been more than 7 days, consider for release
                 if not app_in_latest_release:
@@ -155,17 +193,44 @@ def check_for_new_versions():
                 'package': package,
                 'app_name': app_name,
                 'version': recommended_version,
-                'reason': f'New version {recommended_version} not in released versions: {list(package_released_versions)}'
+                'reason': f'New version {recommended_version} not in released versions: {sorted(package_released_versions)}'
             })
     
     return len(new_versions_found) > 0, new_versions_found
 
+def emit_release_output(needs_release, new_versions_count):
+    """Set GitHub Actions outputs (or print them when running locally)"""
+    output = (
+        f"needs_release={'true' if needs_release else 'false'}\n"
+        f"new_versions_count={new_versions_count}\n"
+    )
+    if 'GITHUB_OUTPUT' in os.environ:
+        with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
+            f.write(output)
+    else:
+        print("GITHUB_OUTPUT environment variable not found")
+        print(output, end='')
+
+def save_pending_release(needs_release, **details):
+    """Save the release decision for later workflow steps"""
+    PENDING_RELEASE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    write_json_file(PENDING_RELEASE_FILE, {
+        'needs_release': needs_release,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        **details
+    }, indent=False)
+
 def main():
     """Main function to check if new release is needed"""
     print("🔍 Checking if new release is needed...")
     print("="*50)
     
-    needs_release, details = check_for_new_versions()
+    # Without a patch analysis there is nothing to compare - skip the GitHub lookups
+    if PATCH_ANALYSIS_FILE.exists():
+        needs_release, details = check_for_new_versions()
+    else:
+        print("❌ Patch analysis file not found")
+        needs_release, details = False, "No patch analysis available"
     
     if needs_release:
         print("✅ New versions detected - release needed!")
@@ -174,52 +239,20 @@ def main():
             print(f"  - {item['app_name']} ({item['package']}): v{item['version']}")
             print(f"    Reason: {item['reason']}")
         
-        # Set GitHub Actions output
-        import os
-        if 'GITHUB_OUTPUT' in os.environ:
-            with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
-                f.write(f"needs_release=true\n")
-                f.write(f"new_versions_count={len(details)}\n")
-        else:
-            print("GITHUB_OUTPUT environment variable not found")
-            print(f"needs_release=true")
-            print(f"new_versions_count={len(details)}")
+        emit_release_output(True, len(details))
         
         # Save details for potential use in later steps
-        output_file = Path("logs/pending_release.json")
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file, 'w') as f:
-            json.dump({
-                'needs_release': True,
-                'timestamp': datetime.now().isoformat(),
-                'new_versions': details
-            }, f, indent=2)
+        save_pending_release(True, new_versions=details)
         
         sys.exit(0)  # Success - proceed with release
     else:
         print("✅ No new versions detected - skipping release")
         print("All currently supported versions have already been released.")
         
-        # Set GitHub Actions output
-        import os
-        if 'GITHUB_OUTPUT' in os.environ:
-            with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
-                f.write(f"needs_release=false\n")
-                f.write(f"new_versions_count=0\n")
-        else:
-            print("GITHUB_OUTPUT environment variable not found")
-            print(f"needs_release=false")
-            print(f"new_versions_count=0")
+        emit_release_output(False, 0)
         
         # Save details
-        output_file = Path("logs/pending_release.json")
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file, 'w') as f:
-            json.dump({
-                'needs_release': False,
-                'timestamp': datetime.now().isoformat(),
-                'reason': 'No new versions to release'
-            }, f, indent=2)
+        save_pending_release(False, reason='No new versions to release')
         
         sys.exit(0)  # Success - but skip release
 
@@ -5,14 +5,89 @@ Create GitHub release with patched APKs
 
 import os
 import json
+import re
 import sys
+import functools
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from datetime import datetime
-from github import Github
-from pipeline_logger import log_release_created
+from datetime import datetime, timezone
+from github import Github, GithubException
+from pipeline_logger import log_release_created, write_json_file
 
 OUTPUT_DIR = Path("output")
 
+# Concurrent asset uploads (kept small to stay clear of GitHub's abuse limits)
+MAX_PARALLEL_UPLOADS = 4
+
+# '-patched.apk' (or '-patched.keystore.apk') suffix of a patched APK filename
+PATCHED_SUFFIX_RE = re.compile(r'-patched(\.keystore)?\.apk$')
+
+# Package, version and architecture of a released APK name, e.g.
+# com.google.android.youtube-v20.14.43-armeabi-v7a-patched.apk
+# (architectures may contain dashes, like armeabi-v7a)
+RELEASE_APK_RE = re.compile(r'^(.+?)-v([\d.]+)-(.+)-patched\.apk$')
+
+# Display names for known packages in the release notes
+APP_NAMES = {
+    'com.google.android.youtube': 'YouTube',
+    'com.google.android.apps.youtube.music': 'YouTube Music',
+    'com.google.android.apps.photos': 'Google Photos',
+    'com.twitter.android': 'Twitter',
+    'com.reddit.frontpage': 'Reddit',
+}
+
+ApkDetails = namedtuple('ApkDetails', 'app_name version variant fname')
+
+@functools.lru_cache(maxsize=None)
+def parse_apk_details(apk_path):
+    """App name, version and variant from a (patched) APK path"""
+    # Example: output/com.google.android.youtube-v20.14.43-universal-patched.apk
+    # Drop the directory and the '-patched.apk' or similar suffix
+    fname = PATCHED_SUFFIX_RE.sub('', Path(apk_path).name)
+    # Split by '-'
+    parts = fname.split('-')
+    if len(parts) >= 3:
+        # com.google.android.youtube-v20.14.43-universal
+        pkg = parts[0]
+        version = parts[1]
+        variant = parts[2]
+    else:
+        pkg = parts[0]
+        version = None
+        variant = None
+    # Map package to app name if possible
+    return ApkDetails(APP_NAMES.get(pkg, pkg), version, variant, fname)
+
+@functools.lru_cache(maxsize=None)
+def get_latest_release(repo):
+    """Newest release of the repository, or None if it has no releases"""
+    # One /releases/latest call, instead of counting and paging the full list
+    try:
+        return repo.get_latest_release()
+    except GithubException as e:
+        if e.status == 404:
+            return None
+        raise
+
+def describe_apk(apk_path):
+    """Release-notes label for an APK, e.g. 'YouTube v20.14.43 - universal'"""
+    app_name, version, variant, _ = parse_apk_details(apk_path)
+    details = app_name
+    if version:
+        details += f" {version}"
+    if variant:
+        details += f" - {variant}"
+    return details
+
+def parse_release_apk_name(filename):
+    """(package, version, architecture) of a patched APK filename, or None"""
+    # Only names with the suffix and a version token can match
+    if not (filename.endswith('-patched.apk') and '-v' in filename):
+        return None
+    match = RELEASE_APK_RE.match(filename)
+    return match.groups() if match else None
+
 def is_identical_to_previous_release(repo, current_successful):
     """
     Check if the current successful patches are identical to the previous release.
@@ -24,83 +99,48 @@ def is_identical_to_previous_release(repo, current_successful):
     """
     try:
         # Get the latest release
-        releases = repo.get_releases()
-        if releases.totalCount == 0:
+        latest_release = get_latest_release(repo)
+        if latest_release is None:
             print("🆕 No previous releases found - proceeding with first release")
             return False
         
-        latest_release = releases[0]
         print(f"🔍 Comparing with previous release: {latest_release.tag_name}")
         
-        # Get assets from previous release
-        previous_assets = {asset.name for asset in latest_release.get_assets()}
+        # Get assets from previous release (already part of the release payload,
+        # so no separate paginated assets request)
+        previous_assets = {asset['name'] for asset in latest_release.raw_data.get('assets', [])}
         
         # Extract app versions from current successful patches
-        current_app_versions = {}
+        current_app_versions = defaultdict(lambda: defaultdict(set))
         for item in current_successful:
             output_apk_path = item.get('output_apk', '')
             if output_apk_path:
                 # Parse the filename to extract app, version, and architecture
                 # e.g., "com.google.android.youtube-v20.14.43-universal-patched.apk"
-                filename = os.path.basename(output_apk_path)
-                if filename.endswith('-patched.apk'):
-                    # Remove -patched.apk suffix
-                    base_name = filename[:-12]  # Remove "-patched.apk"
-                    
-                    # Split into parts: package-version-architecture
-                    # Find last occurrence of version pattern (vX.X.X)
-                    import re
-                    # More flexible regex to handle complex package names
-                    version_match = re.search(r'-v([\d.]+)-([^-]+)$', base_name)
-                    if version_match:
-                        version = version_match.group(1)
-                        architecture = version_match.group(2)
-                        package = base_name[:version_match.start()]
-                    else:
-                        # Fallback: try to parse differently structured names
-                        # Look for pattern: package-v8.10.52-armeabi-v7a
-                        alt_match = re.search(r'-v([\d.]+)-(.+)$', base_name)
-                        if alt_match:
-                            version = alt_match.group(1)
-                            # Handle multi-part architectures like armeabi-v7a
-                            architecture = alt_match.group(2)
-                            package = base_name[:alt_match.start()]
-                        else:
-                            continue  # Skip if we can't parse
-                        
-                        if package not in current_app_versions:
-                            current_app_versions[package] = {}
-                        if version not in current_app_versions[package]:
-                            current_app_versions[package][version] = set()
-                        current_app_versions[package][version].add(architecture)
+                parsed = parse_release_apk_name(os.path.basename(output_apk_path))
+                if not parsed:
+                    continue  # Skip if we can't parse
+                
+                package, version, architecture = parsed
+                current_app_versions[package][version].add(architecture)
+        
+        # More distinct current APKs than the previous release had can never
+        # be a subset of it - no need to parse or compare the previous assets
+        current_apk_count = sum(len(archs) for versions in current_app_versions.values() for archs in versions.values())
+        previous_apk_count = sum(1 for asset_name in previous_assets if asset_name.endswith('-patched.apk'))
+        if current_apk_count > previous_apk_count:
+            print(f"📝 {current_apk_count} patched APKs now vs {previous_apk_count} in previous release - new content")
+            return False
         
-        # Extract app versions from previous release assets
-        previous_app_versions = {}
+        # Extract app versions from previous release assets (same naming)
+        previous_app_versions = defaultdict(lambda: defaultdict(set))
         for asset_name in previous_assets:
-            if asset_name.endswith('.apk'):
-                # Same parsing logic for previous assets
-                import re
-                # More flexible regex for parsing previous assets
-                version_match = re.search(r'-v([\d.]+)-([^-]+)-patched\.apk$', asset_name)
-                if version_match:
-                    version = version_match.group(1)
-                    architecture = version_match.group(2)
-                    package = asset_name[:version_match.start()]
-                else:
-                    # Fallback: try alternative pattern for complex architectures
-                    alt_match = re.search(r'-v([\d.]+)-(.+)-patched\.apk$', asset_name)
-                    if alt_match:
-                        version = alt_match.group(1)
-                        architecture = alt_match.group(2)
-                        package = asset_name[:alt_match.start()]
-                    else:
-                        continue  # Skip if we can't parse
-                    
-                    if package not in previous_app_versions:
-                        previous_app_versions[package] = {}
-                    if version not in previous_app_versions[package]:
-                        previous_app_versions[package][version] = set()
-                    previous_app_versions[package][version].add(architecture)
+            parsed = parse_release_apk_name(asset_name)
+            if not parsed:
+                continue  # Skip if we can't parse
+            
+            package, version, architecture = parsed
+            previous_app_versions[package][version].add(architecture)
         
         # Debug: show what we're comparing
         print(f"� Current successful apps and versions:")
@@ -115,21 +155,14 @@ def is_identical_to_previous_release(repo, current_successful):
         
         # Check if current successful patches are a subset of previous release
         # This means all currently successful apps/versions were already released before
-        current_is_subset_of_previous = True
-        for package, versions in current_app_versions.items():
-            if package not in previous_app_versions:
-                current_is_subset_of_previous = False
-                break
-            for version, archs in versions.items():
-                if version not in previous_app_versions[package]:
-                    current_is_subset_of_previous = False
-                    break
-                # Check if all current architectures exist in previous release
-                if not archs.issubset(previous_app_versions[package][version]):
-                    current_is_subset_of_previous = False
-                    break
-            if not current_is_subset_of_previous:
-                break
+        # (every current architecture was released for the same app version;
+        # all() stops at the first one that wasn't)
+        empty = frozenset()
+        current_is_subset_of_previous = all(
+            archs <= previous_app_versions.get(package, {}).get(version, empty)
+            for package, versions in current_app_versions.items()
+            for version, archs in versions.items()
+        )
         
         if current_is_subset_of_previous and current_app_versions:
             print("✅ All current successful patches already exist in previous release")
@@ -217,86 +250,46 @@ def create_release():
         
         sys.exit(0)
     
-    # Create release tag and title
-    date_str = datetime.now().strftime('%Y-%m-%d')
+    # Create release tag and title (one timestamp, so tag and build date always agree)
+    now = datetime.now(timezone.utc)
+    date_str = now.strftime('%Y-%m-%d')
     tag_name = f"patched-{date_str}"
-    release_title = f"Patched Apps - {datetime.now().strftime('%B %d, %Y')}"
+    release_title = f"Patched Apps - {now.strftime('%B %d, %Y')}"
     
-    # Check if release already exists
+    # Check if release already exists. Tags are per day, so today's release can
+    # only be the newest one, which the comparison above has already fetched.
     try:
-        existing_release = repo.get_release(tag_name)
-        print(f"Release {tag_name} already exists. Deleting and recreating...")
-        existing_release.delete_release()
-    except:
-        pass  # Release doesn't exist, continue
+        existing_release = get_latest_release(repo)
+        if existing_release is not None and existing_release.tag_name == tag_name:
+            print(f"Release {tag_name} already exists. Deleting and recreating...")
+            existing_release.delete_release()
+    except GithubException as e:
+        # Already gone is fine; auth and server errors should fail here, not mid-upload
+        if e.status != 404:
+            raise
     
-    # Build release notes
-    release_notes = f"""# ReVanced Patched Apps
+    # Build release notes (collected as parts and joined once)
+    notes = [f"""# ReVanced Patched Apps
     
 ## 📊 Summary
 - **Successfully Patched:** {len(results['successful'])} apps
 - **Failed:** {len(results['failed'])} apps
-- **Build Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}
+- **Build Date:** {now.strftime('%Y-%m-%d %H:%M:%S UTC')}
 
 ## ✅ Successfully Patched Apps
 
-"""
+"""]
     
-    def parse_apk_details(apk_path):
-        # Example: output/com.google.android.youtube-v20.14.43-universal-patched.apk
-        import re, os
-        fname = os.path.basename(apk_path)
-        # Remove '-patched.apk' or similar suffix
-        fname = re.sub(r'-patched(\.keystore)?\.apk$', '', fname)
-        # Remove output/ prefix if present
-        fname = fname.replace('output/', '')
-        # Split by '-'
-        parts = fname.split('-')
-        # Find app name
-        app_name = None
-        version = None
-        variant = None
-        if len(parts) >= 3:
-            # com.google.android.youtube-v20.14.43-universal
-            pkg = parts[0]
-            version = parts[1]
-            variant = parts[2]
-        else:
-            pkg = parts[0]
-            version = None
-            variant = None
-        # Map package to app name if possible
-        app_map = {
-            'com.google.android.youtube': 'YouTube',
-            'com.google.android.apps.youtube.music': 'YouTube Music',
-            'com.google.android.apps.photos': 'Google Photos',
-            'com.twitter.android': 'Twitter',
-            'com.reddit.frontpage': 'Reddit',
-        }
-        app_name = app_map.get(pkg, pkg)
-        return app_name, version, variant, fname
-
-    for item in results['successful']:
-        app_name, version, variant, fname = parse_apk_details(item['output_apk'])
-        details = f"{app_name}"
-        if version:
-            details += f" {version}"
-        if variant:
-            details += f" - {variant}"
-        release_notes += f"- {details}\n"
+    notes.extend(f"- {describe_apk(item['output_apk'])}\n" for item in results['successful'])
 
     if results['failed']:
-        release_notes += f"\n## ❌ Failed to Patch\n\n"
-        for item in results['failed']:
-            app_name, version, variant, fname = parse_apk_details(item.get('output_apk', item.get('input_apk', '')))
-            details = f"{app_name}"
-            if version:
-                details += f" {version}"
-            if variant:
-                details += f" - {variant}"
-            release_notes += f"- {details} - See issues for details\n"
+        notes.append("\n## ❌ Failed to Patch\n\n")
+        notes.extend(
+            f"- {describe_apk(item.get('output_apk', item.get('input_apk', '')))} - See issues for details\n"
+            for item in results['failed']
+        )
     
-    release_notes += f"""
+    notes.append(f"""
 ## 📥 Installation
 
 1. Download the APK for your desired app
@@ -319,7 +312,8 @@ def create_release():
 
 ---
 *Automated build by GitHub Actions*
-"""
+""")
+    release_notes = "".join(notes)
     
     print(f"Creating release: {tag_name}")
     
@@ -335,21 +329,28 @@ def create_release():
         
         print(f"✓ Created release: {release.html_url}")
         
-        # Upload APKs
+        def upload(apk_path):
+            release.upload_asset(
+                path=str(apk_path),
+                label=apk_path.name,  # Use full filename as asset title
+                content_type="application/vnd.android.package-archive"
+            )
+            return apk_path.name
+        
+        # Upload APKs (network-bound, so several run at once)
         print("\nUploading APKs...")
-        for item in results['successful']:
-            apk_path = Path(item['output_apk'])
-            if apk_path.exists():
-                print(f"  Uploading {apk_path.name}...")
-                with open(apk_path, 'rb') as f:
-                    release.upload_asset(
-                        path=str(apk_path),
-                        label=apk_path.name,  # Use full filename as asset title
-                        content_type="application/vnd.android.package-archive"
-                    )
-                print(f"  ✓ Uploaded {apk_path.name}")
-            else:
-                print(f"  ✗ APK not found: {apk_path}")
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_UPLOADS) as executor:
+            futures = []
+            for item in results['successful']:
+                apk_path = Path(item['output_apk'])
+                if apk_path.exists():
+                    print(f"  Uploading {apk_path.name}...")
+                    futures.append(executor.submit(upload, apk_path))
+                else:
+                    print(f"  ✗ APK not found: {apk_path}")
+            
+            for future in as_completed(futures):
+                print(f"  ✓ Uploaded {future.result()}")
         
         print(f"\n✓ Release created successfully!")
         print(f"  URL: {release.html_url}")
@@ -358,11 +359,10 @@ def create_release():
         release_info = {
             'tag': tag_name,
             'url': release.html_url,
-            'created_at': datetime.now().isoformat()
+            'created_at': now.isoformat()
         }
         
-        with open(OUTPUT_DIR / "release_info.json", 'w') as f:
-            json.dump(release_info, f, indent=2)
+        write_json_file(OUTPUT_DIR / "release_info.json", release_info, indent=False)
         
         # Log the release
         log_release_created(release_info, results)
@@ -6,11 +6,16 @@ Setup script to download latest ReVanced tools
 import os
 import requests
 import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 REVANCED_DIR = Path("revanced")
 REVANCED_DIR.mkdir(exist_ok=True)
 
+# Block size for copying downloads to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 def get_latest_release(repo):
     """Get latest release info from GitHub repo"""
     url = f"https://api.github.com/repos/{repo}/releases/latest"
@@ -21,15 +26,44 @@ def get_latest_release(repo):
 def download_file(url, filename):
     """Download file with progress"""
     print(f"Downloading {filename}...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    with open(REVANCED_DIR / filename, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True  # undo any transfer compression like iter_content would
+        
+        with open(REVANCED_DIR / filename, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, DOWNLOAD_CHUNK_SIZE)
     
     print(f"✓ Downloaded {filename}")
 
+def setup_tool(tool_name, repo):
+    """Download the latest release asset of one tool and record its version"""
+    try:
+        print(f"\nFetching latest {tool_name}...")
+        release = get_latest_release(repo)
+        
+        # Find the appropriate file in assets
+        for asset in release['assets']:
+            asset_name = asset['name']
+            # Download .jar for CLI, .apk for integrations, .rvp for patches
+            if (asset_name.endswith('.jar') or 
+                asset_name.endswith('.apk') or 
+                asset_name.endswith('.rvp')):
+                # Skip signature files
+                if asset_name.endswith('.asc'):
+                    continue
+                    
+                download_file(asset['browser_download_url'], asset_name)
+                
+                # Save version info
+                version_file = REVANCED_DIR / f"{tool_name}-version.txt"
+                with open(version_file, 'w') as f:
+                    f.write(release['tag_name'])
+                break
+        
+    except Exception as e:
+        print(f"✗ Error downloading {tool_name}: {e}")
+        raise
+
 def download_revanced_tools():
     """Download ReVanced CLI, Patches, and Integrations"""
     
@@ -39,33 +73,11 @@ def download_revanced_tools():
         "revanced-integrations": "ReVanced/revanced-integrations"
     }
     
-    for tool_name, repo in tools.items():
-        try:
-            print(f"\nFetching latest {tool_name}...")
-            release = get_latest_release(repo)
-            
-            # Find the appropriate file in assets
-            for asset in release['assets']:
-                asset_name = asset['name']
-                # Download .jar for CLI, .apk for integrations, .rvp for patches
-                if (asset_name.endswith('.jar') or 
-                    asset_name.endswith('.apk') or 
-                    asset_name.endswith('.rvp')):
-                    # Skip signature files
-                    if asset_name.endswith('.asc'):
-                        continue
-                        
-                    download_file(asset['browser_download_url'], asset_name)
-                    
-                    # Save version info
-                    version_file = REVANCED_DIR / f"{tool_name}-version.txt"
-                    with open(version_file, 'w') as f:
-                        f.write(release['tag_name'])
-                    break
-            
-        except Exception as e:
-            print(f"✗ Error downloading {tool_name}: {e}")
-            raise
+    # The tools are independent downloads, so fetch them all at once
+    with ThreadPoolExecutor(max_workers=len(tools)) as executor:
+        futures = [executor.submit(setup_tool, tool_name, repo) for tool_name, repo in tools.items()]
+        for future in futures:
+            future.result()
 
 def main():
     print("Setting up ReVanced tools...")